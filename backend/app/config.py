@@ -13,11 +13,51 @@ class Settings(BaseSettings):
     database_url: str = "sqlite+aiosqlite:///./strava_equipment.db"
     frontend_url: str = "http://localhost:5173"
 
+    # SQLite production profile: WAL + tuned pragmas, a single-writer engine
+    # for jobs and sync, and a pooled read-only engine for GET endpoints
+    sqlite_production_mode: bool = False
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_cache_size_kb: int = 65536
+    sqlite_mmap_size_mb: int = 256
+    sqlite_read_pool_size: int = 5
+    sqlite_pool_timeout_seconds: int = 30  # wait for a free connection, then fail
+
+    # Connection pool for server databases (postgresql+asyncpg)
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_pool_pre_ping: bool = True
+    db_pool_recycle_seconds: int = 1800
+
+    # Per-user cache for dashboard responses ("memory" or "none")
+    response_cache_backend: str = "memory"
+    response_cache_max_entries: int = 1024
+
+    # Memory cap for the per-user activity snapshots used by rule evaluation
+    rule_activity_cache_mb: int = 64
+
     # Strava API
     strava_auth_url: str = "https://www.strava.com/oauth/authorize"
     strava_token_url: str = "https://www.strava.com/oauth/token"
     strava_api_base: str = "https://www.strava.com/api/v3"
 
+    # Activity sync
+    sync_default_days: int = 30  # window for a user's first sync
+    sync_cursor_overlap_hours: int = 24  # re-read window for late uploads
+    # Pause a backfill once the worker's RSS has grown by this many MB since the
+    # backfill started (0 = no limit); starting it again resumes from its
+    # saved checkpoint
+    backfill_memory_limit_mb: int = 0
+    backfill_max_retries: int = 5  # retries per page for unexpected errors, with backoff
+
+    # Background jobs
+    job_workers: int = 4  # jobs run concurrently across all users
+    job_max_per_user: int = 2  # jobs run concurrently for one user
+    job_progress_interval_seconds: float = 2.0  # throttle for progress writes
+    job_heartbeat_timeout_seconds: int = 120  # running jobs silent this long are dead
+    job_retention_days: int = 7  # finished jobs are purged after this
+    job_retention_count: int = 10  # finished jobs kept per user, kind and resource
+    job_events_heartbeat_seconds: int = 15  # keep-alive interval on the SSE stream
+
     class Config:
         env_file = ".env"
         extra = "ignore"
@@ -1,26 +1,125 @@
+from sqlalchemy import Date, cast, event, func
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from app.config import get_settings
 
 settings = get_settings()
 
-engine = create_async_engine(
-    settings.database_url,
-    echo=False,
-    future=True
+is_postgres = settings.database_url.startswith("postgresql")
+
+use_sqlite_profile = (
+    settings.sqlite_production_mode
+    and settings.database_url.startswith("sqlite")
+    and ":memory:" not in settings.database_url
 )
 
+
+def _sqlite_pragma_listener(read_only: bool):
+    """Build a connect hook applying the production pragmas to each connection."""
+    pragmas = [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}",
+        f"PRAGMA cache_size=-{settings.sqlite_cache_size_kb}",
+        f"PRAGMA mmap_size={settings.sqlite_mmap_size_mb * 1024 * 1024}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only=ON")
+
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return on_connect
+
+
+if use_sqlite_profile:
+    # SQLite allows one writer at a time; serialise writes in-process instead of
+    # letting connections fight over the database lock. Write sessions must
+    # therefore not stay open across Strava calls.
+    engine = create_async_engine(
+        settings.database_url,
+        echo=False,
+        future=True,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=settings.sqlite_pool_timeout_seconds,
+    )
+    read_engine = create_async_engine(
+        settings.database_url,
+        echo=False,
+        future=True,
+        pool_size=settings.sqlite_read_pool_size,
+        max_overflow=0,
+        pool_timeout=settings.sqlite_pool_timeout_seconds,
+    )
+    event.listen(engine.sync_engine, "connect", _sqlite_pragma_listener(read_only=False))
+    event.listen(read_engine.sync_engine, "connect", _sqlite_pragma_listener(read_only=True))
+elif is_postgres:
+    # PostgreSQL handles concurrent writers itself, so one pooled engine
+    # serves reads and writes from every API process and job worker
+    engine = create_async_engine(
+        settings.database_url,
+        echo=False,
+        future=True,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        pool_recycle=settings.db_pool_recycle_seconds,
+    )
+    read_engine = engine
+else:
+    engine = create_async_engine(
+        settings.database_url,
+        echo=False,
+        future=True
+    )
+    read_engine = engine
+
 async_session = async_sessionmaker(
     engine,
     class_=AsyncSession,
     expire_on_commit=False
 )
 
+read_session = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
 
 class Base(DeclarativeBase):
     pass
 
 
+def day_bucket(column, dialect_name: str):
+    """SQL expression truncating a datetime column to its date."""
+    if dialect_name == "postgresql":
+        return cast(column, Date)
+    return func.date(column)
+
+
+def dialect_insert(dialect_name: str):
+    """Return the dialect-specific INSERT construct supporting ON CONFLICT."""
+    if dialect_name == "sqlite":
+        return sqlite.insert
+    if dialect_name == "postgresql":
+        return postgresql.insert
+    raise NotImplementedError(f"Upsert is not supported for dialect '{dialect_name}'")
+
+
+def month_bucket(column, dialect_name: str):
+    """SQL expression formatting a datetime column as its 'YYYY-MM' month."""
+    if dialect_name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+
 async def get_db():
     async with async_session() as session:
         try:
@@ -33,6 +132,24 @@ async def get_db():
             await session.close()
 
 
+async def get_read_db():
+    """Session for read-only endpoints; never commits."""
+    async with read_session() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
 async def init_db():
+    from app.migrations import run_migrations
+
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+
+
+async def close_db():
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
@@ -1,21 +1,48 @@
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import get_settings
-from app.database import init_db
-from app.routers import auth_router, activities_router, equipment_router, rules_router
+from app.database import init_db, close_db
+from app.routers import auth_router, activities_router, equipment_router, rules_router, jobs_router
+from app.routers.activities import resume_backfills
+from app.routers.etag import NotModified, not_modified_handler
+from app.services.scheduler import get_job_scheduler
 
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+async def sweep_interrupted_backfills():
+    """
+    Resume backfills abandoned by a process that crashed. Their jobs are
+    still marked active until the heartbeat expires, so they are missed by
+    the startup sweep and picked up here once they have gone stale.
+    """
+    while True:
+        await asyncio.sleep(settings.job_heartbeat_timeout_seconds)
+        try:
+            await resume_backfills()
+        except Exception:
+            # e.g. the database is briefly unavailable; retry on the next sweep
+            logger.exception("Could not resume interrupted backfills")
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await init_db()
+    await get_job_scheduler().start()
+    await resume_backfills()
+    sweep = asyncio.create_task(sweep_interrupted_backfills())
     yield
     # Shutdown
-    pass
+    sweep.cancel()
+    await asyncio.gather(sweep, return_exceptions=True)
+    await get_job_scheduler().stop()
+    await close_db()
 
 
 app = FastAPI(
@@ -32,13 +59,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+# Conditional GETs answered from the ETag dependency
+app.add_exception_handler(NotModified, not_modified_handler)
+
 # Include routers
 app.include_router(auth_router, prefix="/api")
 app.include_router(activities_router, prefix="/api")
 app.include_router(equipment_router, prefix="/api")
 app.include_router(rules_router, prefix="/api")
+app.include_router(jobs_router, prefix="/api")
 
 
 @app.get("/")
@@ -0,0 +1,167 @@
+"""
+Versioned schema migrations.
+
+`create_all` only creates missing tables, so every change to an existing
+table (new columns, new indexes) is added here as a numbered migration.
+`init_db` runs `create_all` first and then applies any migration whose
+version is not yet recorded in `schema_migrations`. Migrations must be
+idempotent because a fresh database already has the latest schema.
+"""
+from datetime import datetime
+from typing import Callable
+from sqlalchemy import Column, Connection, DateTime, Integer, String, Table, delete, func, inspect, insert, select, text, update
+from sqlalchemy.schema import CreateIndex
+
+from app.database import Base
+
+schema_migrations = Table(
+    "schema_migrations",
+    Base.metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def add_column(conn: Connection, table_name: str, column_name: str):
+    """Add a model column to an existing table if it is missing."""
+    existing = {column["name"] for column in inspect(conn).get_columns(table_name)}
+    if column_name in existing:
+        return
+    column = Base.metadata.tables[table_name].columns[column_name]
+    column_type = column.type.compile(dialect=conn.dialect)
+    if column.server_default is not None:
+        # Existing rows take the default
+        column_type += f" NOT NULL DEFAULT {column.server_default.arg}"
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+
+
+def create_indexes(conn: Connection, table_name: str, *index_names: str):
+    """Create model-defined indexes on an existing table if they are missing."""
+    indexes = {index.name: index for index in Base.metadata.tables[table_name].indexes}
+    for name in index_names:
+        # IF NOT EXISTS rather than reflection, which skips expression indexes
+        conn.execute(CreateIndex(indexes[name], if_not_exists=True))
+
+
+def _001_activity_content_hash(conn: Connection):
+    add_column(conn, "activities", "content_hash")
+
+
+def _002_hot_path_indexes(conn: Connection):
+    create_indexes(
+        conn,
+        "activities",
+        "ix_activities_user_start_date",
+        "ix_activities_user_gear_start_date",
+        "ix_activities_user_type_start_date",
+    )
+    create_indexes(conn, "equipment", "ix_equipment_user_type_name")
+    create_indexes(conn, "rules", "ix_rules_user_priority")
+    create_indexes(conn, "rule_conditions", "ix_rule_conditions_rule_id")
+
+
+def _003_keyset_sort_indexes(conn: Connection):
+    create_indexes(
+        conn,
+        "activities",
+        "ix_activities_user_name",
+        "ix_activities_user_distance",
+        "ix_activities_user_moving_time",
+    )
+
+
+def _004_gear_usage_rollup(conn: Connection):
+    # The table itself comes from create_all; populate it from existing activities
+    from app.models.rollup import GearUsageRollup
+    from app.services.rollups import ROLLUP_COLUMNS, rollup_source
+
+    conn.execute(delete(GearUsageRollup))
+    conn.execute(
+        insert(GearUsageRollup).from_select(ROLLUP_COLUMNS, rollup_source(conn.dialect.name))
+    )
+
+
+def _005_jobs(conn: Connection):
+    from app.models.job import Job
+
+    Job.__table__.create(conn, checkfirst=True)
+    create_indexes(
+        conn,
+        "jobs",
+        "ix_jobs_user_kind_created",
+        "ix_jobs_status_heartbeat",
+        "ix_jobs_finished_at",
+    )
+
+
+def _006_job_checkpoint(conn: Connection):
+    add_column(conn, "jobs", "checkpoint")
+
+
+def _007_job_lookup_indexes(conn: Connection):
+    from app.models.job import Job
+    from app.services.jobs import ACTIVE_STATUSES
+
+    # Only the newest active job per user, kind and resource may stay active
+    # under the unique index; older duplicates were left behind by races
+    ranked = select(
+        Job.id,
+        func.row_number()
+        .over(
+            partition_by=(Job.user_id, Job.kind, func.coalesce(Job.resource_id, 0)),
+            order_by=Job.created_at.desc(),
+        )
+        .label("rank"),
+    ).where(Job.status.in_(ACTIVE_STATUSES)).subquery()
+    conn.execute(
+        update(Job)
+        .where(Job.id.in_(select(ranked.c.id).where(ranked.c.rank > 1)))
+        .values(status="interrupted", finished_at=datetime.utcnow())
+    )
+    create_indexes(conn, "jobs", "ix_jobs_user_kind_resource_created", "ux_jobs_active")
+
+
+def _008_sync_state_data_version(conn: Connection):
+    add_column(conn, "sync_states", "data_version")
+
+
+def _009_gear_usage_rollup_unique(conn: Connection):
+    # Overlapping refreshes could leave duplicate groups behind; rebuild the
+    # table from activities before the unique index goes on
+    _004_gear_usage_rollup(conn)
+    create_indexes(conn, "gear_usage_rollup", "ux_gear_usage_rollup_group")
+
+
+# (version, name, migration) in the order they must be applied
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "activity_content_hash", _001_activity_content_hash),
+    (2, "hot_path_indexes", _002_hot_path_indexes),
+    (3, "keyset_sort_indexes", _003_keyset_sort_indexes),
+    (4, "gear_usage_rollup", _004_gear_usage_rollup),
+    (5, "jobs", _005_jobs),
+    (6, "job_checkpoint", _006_job_checkpoint),
+    (7, "job_lookup_indexes", _007_job_lookup_indexes),
+    (8, "sync_state_data_version", _008_sync_state_data_version),
+    (9, "gear_usage_rollup_unique", _009_gear_usage_rollup_unique),
+]
+
+
+def run_migrations(conn: Connection) -> list[int]:
+    """Apply pending migrations and return the versions that were applied."""
+    schema_migrations.create(conn, checkfirst=True)
+    applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+    newly_applied = []
+    for version, name, migration in MIGRATIONS:
+        if version in applied:
+            continue
+        migration(conn)
+        conn.execute(
+            insert(schema_migrations).values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            )
+        )
+        newly_applied.append(version)
+
+    return newly_applied
@@ -2,5 +2,8 @@ from app.models.user import User
 from app.models.equipment import Equipment
 from app.models.activity import Activity
 from app.models.rule import Rule, RuleCondition
+from app.models.sync_state import SyncState
+from app.models.rollup import GearUsageRollup
+from app.models.job import Job
 
-__all__ = ["User", "Equipment", "Activity", "Rule", "RuleCondition"]
+__all__ = ["User", "Equipment", "Activity", "Rule", "RuleCondition", "SyncState", "GearUsageRollup", "Job"]
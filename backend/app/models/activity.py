@@ -1,11 +1,23 @@
 from datetime import datetime
-from sqlalchemy import String, DateTime, Integer, Boolean, ForeignKey, Float, BigInteger
+from sqlalchemy import String, DateTime, Integer, Boolean, ForeignKey, Float, BigInteger, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base
 
 
 class Activity(Base):
     __tablename__ = "activities"
+    __table_args__ = (
+        # Listing default sort, date filters, backfill oldest-activity lookup
+        Index("ix_activities_user_start_date", "user_id", "start_date"),
+        # Equipment filter, per-gear stats and usage history
+        Index("ix_activities_user_gear_start_date", "user_id", "gear_id", "start_date"),
+        # Activity type filter
+        Index("ix_activities_user_type_start_date", "user_id", "activity_type", "start_date"),
+        # Keyset pagination for the remaining sort columns
+        Index("ix_activities_user_name", "user_id", "name"),
+        Index("ix_activities_user_distance", "user_id", "distance"),
+        Index("ix_activities_user_moving_time", "user_id", "moving_time"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     strava_activity_id: Mapped[int] = mapped_column(BigInteger, unique=True, index=True)
@@ -39,6 +51,10 @@ class Activity(Base):
     external_id: Mapped[str | None] = mapped_column(String(200))
     device_name: Mapped[str | None] = mapped_column(String(200))
 
+    # Hash of the Strava-sourced fields, used to skip unchanged rows on sync.
+    # Local edits clear it, so the next sync always rewrites the row.
+    content_hash: Mapped[str | None] = mapped_column(String(64))
+
     # Timestamps
     synced_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -1,11 +1,14 @@
 from datetime import datetime
-from sqlalchemy import String, DateTime, Integer, Boolean, ForeignKey, Float
+from sqlalchemy import String, DateTime, Integer, Boolean, ForeignKey, Float, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base
 
 
 class Equipment(Base):
     __tablename__ = "equipment"
+    __table_args__ = (
+        Index("ix_equipment_user_type_name", "user_id", "equipment_type", "name"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     strava_gear_id: Mapped[str] = mapped_column(String(50), unique=True, index=True)
@@ -0,0 +1,51 @@
+from datetime import datetime
+from sqlalchemy import JSON, String, DateTime, Integer, ForeignKey, Index, text
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+
+class Job(Base):
+    """A background job (backfill, rule apply) and its last recorded progress."""
+
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Latest job of a kind for a user (backfill status)
+        Index("ix_jobs_user_kind_created", "user_id", "kind", "created_at"),
+        # Latest job of a kind for one resource (rule apply status)
+        Index("ix_jobs_user_kind_resource_created", "user_id", "kind", "resource_id", "created_at"),
+        # At most one active job per user, kind and resource; the database
+        # enforces it so concurrent starts cannot both pass. The statuses
+        # are app.services.jobs.ACTIVE_STATUSES.
+        Index(
+            "ux_jobs_active",
+            "user_id",
+            "kind",
+            text("coalesce(resource_id, 0)"),
+            unique=True,
+            sqlite_where=text("status IN ('queued', 'running', 'rate_limited')"),
+            postgresql_where=text("status IN ('queued', 'running', 'rate_limited')"),
+        ),
+        # Startup sweep for running jobs whose worker stopped heartbeating
+        Index("ix_jobs_status_heartbeat", "status", "heartbeat_at"),
+        # Retention purge
+        Index("ix_jobs_finished_at", "finished_at"),
+    )
+
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    kind: Mapped[str] = mapped_column(String(30))  # backfill, rule_apply, rule_apply_all
+    resource_id: Mapped[int | None] = mapped_column(Integer)  # e.g. the rule being applied
+    params: Mapped[dict] = mapped_column(JSON, default=dict)
+
+    # State
+    status: Mapped[str] = mapped_column(String(20), default="queued")
+    message: Mapped[str | None] = mapped_column(String(500))
+    progress: Mapped[dict] = mapped_column(JSON, default=dict)  # kind-specific counters
+    errors: Mapped[list] = mapped_column(JSON, default=list)  # most recent errors only
+    checkpoint: Mapped[dict | None] = mapped_column(JSON)  # resume position, committed with the work
+
+    # Timestamps
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    started_at: Mapped[datetime | None] = mapped_column(DateTime)
+    heartbeat_at: Mapped[datetime | None] = mapped_column(DateTime)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime)
@@ -0,0 +1,37 @@
+from datetime import date, datetime
+from sqlalchemy import String, Date, DateTime, Integer, Float, ForeignKey, Index, text
+from sqlalchemy.orm import Mapped, mapped_column
+from app.database import Base
+
+
+class GearUsageRollup(Base):
+    """Per-day activity totals for each (user, gear, activity type)."""
+
+    __tablename__ = "gear_usage_rollup"
+    __table_args__ = (
+        Index("ix_gear_usage_rollup_user_day", "user_id", "day"),
+        Index("ix_gear_usage_rollup_user_gear_day", "user_id", "gear_id", "day"),
+        # One row per group, so overlapping refreshes upsert instead of
+        # adding their totals twice. No gear counts as gear 0.
+        Index(
+            "ux_gear_usage_rollup_group",
+            "user_id",
+            text("coalesce(gear_id, 0)"),
+            "activity_type",
+            "day",
+            unique=True,
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
+    gear_id: Mapped[int | None] = mapped_column(ForeignKey("equipment.id"))  # None = no gear
+    activity_type: Mapped[str] = mapped_column(String(50))
+    day: Mapped[date] = mapped_column(Date)  # UTC day of start_date
+
+    # Totals
+    activity_count: Mapped[int] = mapped_column(Integer, default=0)
+    distance: Mapped[float] = mapped_column(Float, default=0)  # meters
+    moving_time: Mapped[int] = mapped_column(Integer, default=0)  # seconds
+    elevation_gain: Mapped[float] = mapped_column(Float, default=0)  # meters
+    last_start_date: Mapped[datetime | None] = mapped_column(DateTime)
@@ -1,11 +1,14 @@
 from datetime import datetime
-from sqlalchemy import String, DateTime, Integer, Boolean, ForeignKey
+from sqlalchemy import String, DateTime, Integer, Boolean, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.database import Base
 
 
 class Rule(Base):
     __tablename__ = "rules"
+    __table_args__ = (
+        Index("ix_rules_user_priority", "user_id", "priority"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
@@ -34,7 +37,7 @@ class RuleCondition(Base):
     __tablename__ = "rule_conditions"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    rule_id: Mapped[int] = mapped_column(ForeignKey("rules.id"))
+    rule_id: Mapped[int] = mapped_column(ForeignKey("rules.id"), index=True)
 
     # Condition details
     field: Mapped[str] = mapped_column(String(50))  # name, activity_type, trainer, etc.
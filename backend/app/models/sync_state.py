@@ -0,0 +1,24 @@
+from datetime import datetime
+from sqlalchemy import DateTime, ForeignKey, Integer
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+from app.database import Base
+
+
+class SyncState(Base):
+    __tablename__ = "sync_states"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+
+    # High-water mark: start date of the newest activity we have stored
+    latest_activity_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+    # Timestamps
+    last_synced_at: Mapped[datetime | None] = mapped_column(DateTime)
+    last_edits_sweep_at: Mapped[datetime | None] = mapped_column(DateTime)
+
+    # Bumped in the transaction of every write to the user's data; keys the
+    # response cache, ETags and activity snapshots in every process
+    data_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
+    # Relationships
+    user = relationship("User", back_populates="sync_state")
@@ -33,6 +33,9 @@ class User(Base):
     equipment = relationship("Equipment", back_populates="user", cascade="all, delete-orphan")
     activities = relationship("Activity", back_populates="user", cascade="all, delete-orphan")
     rules = relationship("Rule", back_populates="user", cascade="all, delete-orphan")
+    sync_state = relationship(
+        "SyncState", back_populates="user", uselist=False, cascade="all, delete-orphan"
+    )
 
     def is_token_expired(self) -> bool:
         if not self.token_expires_at:
@@ -1,54 +1,127 @@
 import asyncio
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile, File
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, tuple_
 from sqlalchemy.orm import selectinload
 
-from app.database import get_db, async_session
+from app.config import get_settings
+from app.database import get_db, get_read_db, async_session, read_session
 from app.models.user import User
 from app.models.activity import Activity
 from app.models.equipment import Equipment
+from app.models.sync_state import SyncState
+from app.models.rollup import GearUsageRollup
+from app.models.job import Job
 from app.schemas.activity import ActivityResponse, ActivityFilter, ActivityUpdate, ActivityBulkUpdate
-from app.routers.auth import get_current_user
+from app.routers.auth import get_current_user, get_streaming_user
+from app.routers.etag import check_etag
 from app.services.strava import StravaService
+from app.services.activity_sync import (
+    advance_sync_cursor,
+    get_sync_state,
+    latest_start_date,
+    upsert_activities,
+)
+from app.services.sync_pipeline import SyncPipeline, process_rss_mb
+from app.services.jobs import (
+    RESUMABLE_STATUSES,
+    JobConflictError,
+    JobRun,
+    create_job,
+    expire_jobs,
+    job_status,
+    latest_job,
+    resume_job,
+    save_checkpoint,
+)
+from app.services.scheduler import JobPriority, get_job_scheduler
+from app.services.pagination import encode_cursor, decode_cursor
+from app.services.rollups import activity_days, refresh_rollups
+from app.services.cache import cached_response, invalidate_user
+from app.services.archive_import import ArchiveImportError, import_strava_archive
+from app.services.export import (
+    EXPORT_FORMATS,
+    encode_export,
+    export_batches,
+    export_statement,
+    parquet_available,
+)
 
 router = APIRouter(prefix="/activities", tags=["activities"])
+settings = get_settings()
 
-# In-memory backfill status tracking (per user)
-backfill_status: dict[int, dict] = {}
+# Counters reported by backfill jobs; BACKFILL_COUNTERS are also checkpointed
+BACKFILL_COUNTERS = ("pages_processed", "activities_found", "created", "updated", "unchanged")
+BACKFILL_PROGRESS = {
+    **{key: 0 for key in BACKFILL_COUNTERS},
+    "objects_held": 0,
+    "peak_objects_held": 0,
+    "memory_mb": None,
+    "memory_growth_mb": None,
+}
 
+# First retry delay after an unexpected page error; doubles on each retry
+BACKFILL_RETRY_DELAY_SECONDS = 5
 
-@router.get("/stats")
+
+@router.get("/stats", dependencies=[Depends(check_etag)])
+@cached_response
 async def get_activity_stats(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
     """Get activity statistics for the current user."""
-    # Total count
-    count_result = await db.execute(
-        select(func.count(Activity.id)).where(Activity.user_id == user.id)
-    )
-    total_count = count_result.scalar() or 0
-
-    # Total distance and time
+    # Summed from the daily rollups rather than scanning every activity
     stats_result = await db.execute(
         select(
-            func.sum(Activity.distance).label("total_distance"),
-            func.sum(Activity.moving_time).label("total_time"),
-        ).where(Activity.user_id == user.id)
+            func.sum(GearUsageRollup.activity_count).label("total_activities"),
+            func.sum(GearUsageRollup.distance).label("total_distance"),
+            func.sum(GearUsageRollup.moving_time).label("total_time"),
+        ).where(GearUsageRollup.user_id == user.id)
     )
     stats = stats_result.one()
 
     return {
-        "total_activities": total_count,
+        "total_activities": stats.total_activities or 0,
         "total_distance": stats.total_distance or 0,
         "total_time": stats.total_time or 0,
     }
 
 
-@router.get("", response_model=list[ActivityResponse])
+def filter_activities(
+    query,
+    search: str | None,
+    activity_type: str | None,
+    equipment_id: int | None,
+    trainer: bool | None,
+    date_from: datetime | None,
+    date_to: datetime | None,
+):
+    """Apply the activity listing filters to a query."""
+    if search:
+        query = query.where(Activity.name.ilike(f"%{search}%"))
+    if activity_type:
+        query = query.where(Activity.activity_type == activity_type)
+    if equipment_id:
+        query = query.where(Activity.gear_id == equipment_id)
+    if trainer is not None:
+        query = query.where(Activity.trainer == trainer)
+    if date_from:
+        query = query.where(Activity.start_date >= date_from)
+    if date_to:
+        query = query.where(Activity.start_date <= date_to)
+    return query
+
+
+@router.get(
+    "",
+    response_model=list[ActivityResponse],
+    dependencies=[Depends(check_etag)],
+)
 async def get_activities(
+    response: Response,
     search: str | None = None,
     activity_type: str | None = None,
     equipment_id: int | None = None,
@@ -59,79 +132,135 @@ async def get_activities(
     sort_order: str = Query("desc", pattern="^(asc|desc)$"),
     limit: int = Query(50, le=200),
     offset: int = 0,
-    db: AsyncSession = Depends(get_db),
+    cursor: str | None = None,
+    db: AsyncSession = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
-    """Get activities with optional filters, sorting, and pagination."""
-    query = select(Activity).where(Activity.user_id == user.id)
+    """
+    Get activities with optional filters, sorting, and pagination.
+
+    Pages can be requested by `offset` or by the opaque `cursor` returned in
+    the `X-Next-Cursor` header of the previous page. Cursor pagination seeks
+    directly to the next row instead of skipping all preceding ones.
+    """
+    query = (
+        select(Activity, Equipment.name)
+        .outerjoin(Equipment, Activity.gear_id == Equipment.id)
+        .where(Activity.user_id == user.id)
+    )
 
-    # Apply sorting
+    # Apply sorting (id breaks ties so keyset pages never skip or repeat rows)
     sort_column = getattr(Activity, sort_by, Activity.start_date)
     if sort_order == "desc":
-        query = query.order_by(sort_column.desc())
+        query = query.order_by(sort_column.desc(), Activity.id.desc())
     else:
-        query = query.order_by(sort_column.asc())
+        query = query.order_by(sort_column.asc(), Activity.id.asc())
 
-    # Apply filters
-    if search:
-        query = query.where(Activity.name.ilike(f"%{search}%"))
-    if activity_type:
-        query = query.where(Activity.activity_type == activity_type)
-    if equipment_id:
-        query = query.where(Activity.gear_id == equipment_id)
-    if trainer is not None:
-        query = query.where(Activity.trainer == trainer)
-    if date_from:
-        query = query.where(Activity.start_date >= date_from)
-    if date_to:
-        query = query.where(Activity.start_date <= date_to)
+    query = filter_activities(
+        query, search, activity_type, equipment_id, trainer, date_from, date_to
+    )
 
-    query = query.offset(offset).limit(limit)
+    if cursor:
+        try:
+            last_value, last_id = decode_cursor(cursor, sort_by, sort_order)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        position = tuple_(sort_column, Activity.id)
+        if sort_order == "desc":
+            query = query.where(position < tuple_(last_value, last_id))
+        else:
+            query = query.where(position > tuple_(last_value, last_id))
+        query = query.limit(limit)
+    else:
+        query = query.offset(offset).limit(limit)
 
     result = await db.execute(query)
-    activities = result.scalars().all()
+    rows = result.all()
+
+    activity_list = []
+    for activity, gear_name in rows:
+        item = ActivityResponse.model_validate(activity)
+        item.gear_name = gear_name
+        activity_list.append(item)
+
+    if len(rows) == limit:
+        last = rows[-1].Activity
+        response.headers["X-Next-Cursor"] = encode_cursor(
+            sort_by, sort_order, getattr(last, sort_by), last.id
+        )
 
-    # Get equipment names
-    response = []
-    for activity in activities:
-        activity_dict = ActivityResponse.model_validate(activity).model_dump()
-        if activity.gear_id:
-            eq_result = await db.execute(
-                select(Equipment).where(Equipment.id == activity.gear_id)
-            )
-            equipment = eq_result.scalar_one_or_none()
-            activity_dict["gear_name"] = equipment.name if equipment else None
-        response.append(ActivityResponse(**activity_dict))
+    return activity_list
+
+
+@router.get("/export")
+async def export_activities(
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    search: str | None = None,
+    activity_type: str | None = None,
+    equipment_id: int | None = None,
+    trainer: bool | None = None,
+    date_from: datetime | None = None,
+    date_to: datetime | None = None,
+    user: User = Depends(get_streaming_user),
+):
+    """
+    Export all matching activities (with gear names) as CSV, NDJSON or
+    Parquet. Rows are streamed from a server-side cursor in batches, so the
+    response is sent with chunked encoding and never held in memory whole.
+    Parquet needs the optional pyarrow package.
+    """
+    if format == "parquet" and not parquet_available():
+        raise HTTPException(
+            status_code=400, detail="Parquet export requires the pyarrow package"
+        )
 
-    return response
+    statement = filter_activities(
+        export_statement(Activity.user_id == user.id),
+        search, activity_type, equipment_id, trainer, date_from, date_to,
+    )
+    user_id = user.id
+
+    async def content():
+        # Request-scoped sessions stay open until the body has been sent, so
+        # the user was looked up without one and the export opens its own
+        # session only for as long as it streams
+        async with read_session() as db:
+            async for chunk in encode_export(format, export_batches(db, user_id, statement)):
+                yield chunk
+
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        content(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="activities.{extension}"'},
+    )
 
 
-@router.get("/{activity_id}", response_model=ActivityResponse)
+@router.get(
+    "/{activity_id}",
+    response_model=ActivityResponse,
+    dependencies=[Depends(check_etag)],
+)
 async def get_activity(
     activity_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
     """Get a specific activity by ID."""
     result = await db.execute(
-        select(Activity).where(
-            Activity.id == activity_id, Activity.user_id == user.id
-        )
+        select(Activity, Equipment.name)
+        .outerjoin(Equipment, Activity.gear_id == Equipment.id)
+        .where(Activity.id == activity_id, Activity.user_id == user.id)
     )
-    activity = result.scalar_one_or_none()
+    row = result.one_or_none()
 
-    if not activity:
+    if not row:
         raise HTTPException(status_code=404, detail="Activity not found")
 
-    activity_dict = ActivityResponse.model_validate(activity).model_dump()
-    if activity.gear_id:
-        eq_result = await db.execute(
-            select(Equipment).where(Equipment.id == activity.gear_id)
-        )
-        equipment = eq_result.scalar_one_or_none()
-        activity_dict["gear_name"] = equipment.name if equipment else None
-
-    return ActivityResponse(**activity_dict)
+    activity, gear_name = row
+    item = ActivityResponse.model_validate(activity)
+    item.gear_name = gear_name
+    return item
 
 
 @router.patch("/{activity_id}/equipment", response_model=ActivityResponse)
@@ -152,6 +281,7 @@ async def update_activity_equipment(
     if not activity:
         raise HTTPException(status_code=404, detail="Activity not found")
 
+    equipment = None
     if update.gear_id:
         # Verify equipment exists and belongs to user
         eq_result = await db.execute(
@@ -164,164 +294,171 @@ async def update_activity_equipment(
         if not equipment:
             raise HTTPException(status_code=404, detail="Equipment not found")
 
-        # Update on Strava
-        strava = StravaService(user.access_token)
-        try:
-            await strava.update_activity(
-                activity.strava_activity_id, gear_id=equipment.strava_gear_id
-            )
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"Failed to update Strava: {str(e)}"
-            )
+    # Release the write connection while we talk to Strava
+    await db.commit()
 
-        activity.gear_id = equipment.id
-        activity.strava_gear_id = equipment.strava_gear_id
-    else:
-        # Remove equipment
-        strava = StravaService(user.access_token)
-        try:
-            await strava.update_activity(activity.strava_activity_id, gear_id="none")
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"Failed to update Strava: {str(e)}"
-            )
+    # Update on Strava ("none" removes the equipment)
+    strava = StravaService(user.access_token)
+    try:
+        await strava.update_activity(
+            activity.strava_activity_id,
+            gear_id=equipment.strava_gear_id if equipment else "none",
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to update Strava: {str(e)}"
+        )
 
-        activity.gear_id = None
-        activity.strava_gear_id = None
+    activity.gear_id = equipment.id if equipment else None
+    activity.strava_gear_id = equipment.strava_gear_id if equipment else None
+    activity.content_hash = None
 
+    await refresh_rollups(db, user.id, activity_days(activity.start_date))
+    await invalidate_user(db, user.id)
     await db.commit()
     await db.refresh(activity)
 
-    return ActivityResponse.model_validate(activity)
+    item = ActivityResponse.model_validate(activity)
+    item.gear_name = equipment.name if equipment else None
+    return item
 
 
-@router.post("/sync")
-async def sync_activities(
-    days: int = Query(30, le=365),
-    db: AsyncSession = Depends(get_db),
-    user: User = Depends(get_current_user),
-):
-    """Sync activities from Strava."""
+async def sync_activities_after(
+    db: AsyncSession, user: User, state: SyncState, after: datetime
+) -> dict[str, int]:
+    """Fetch and store every activity that started after `after`."""
     strava = StravaService(user.access_token)
 
     # Get equipment mapping
     eq_result = await db.execute(
         select(Equipment).where(Equipment.user_id == user.id)
     )
-    equipment_map = {eq.strava_gear_id: eq for eq in eq_result.scalars().all()}
+    equipment_map = {eq.strava_gear_id: eq.id for eq in eq_result.scalars().all()}
 
-    # Calculate date range
-    after = datetime.utcnow() - timedelta(days=days) if days else None
+    # Release the write connection while pages are fetched; each batch
+    # write takes it again only for its own transaction
+    await db.commit()
 
-    synced_count = 0
-    created_count = 0
-    updated_count = 0
-    page = 1
+    async def fetch_pages():
+        page = 1
+        while True:
+            try:
+                activities = await strava.get_athlete_activities(
+                    after=after, page=page, per_page=50
+                )
+            except Exception as e:
+                raise HTTPException(
+                    status_code=500, detail=f"Failed to fetch from Strava: {str(e)}"
+                )
 
-    while True:
-        try:
-            activities = await strava.get_athlete_activities(
-                after=after, page=page, per_page=50
-            )
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, detail=f"Failed to fetch from Strava: {str(e)}"
-            )
+            if not activities:
+                return
 
-        if not activities:
-            break
+            yield activities
+            page += 1
 
-        for activity_data in activities:
-            strava_id = activity_data["id"]
+            # Stop if we got less than a full page
+            if len(activities) < 50:
+                return
 
-            # Check if activity exists
-            result = await db.execute(
-                select(Activity).where(
-                    Activity.strava_activity_id == strava_id,
-                    Activity.user_id == user.id,
-                )
-            )
-            existing = result.scalar_one_or_none()
-
-            # Map gear
-            strava_gear_id = activity_data.get("gear_id")
-            gear_id = None
-            if strava_gear_id and strava_gear_id in equipment_map:
-                gear_id = equipment_map[strava_gear_id].id
-
-            if existing:
-                # Update existing activity
-                existing.name = activity_data.get("name", existing.name)
-                existing.activity_type = activity_data.get("type", existing.activity_type)
-                existing.sport_type = activity_data.get("sport_type")
-                existing.distance = activity_data.get("distance", 0)
-                existing.moving_time = activity_data.get("moving_time", 0)
-                existing.elapsed_time = activity_data.get("elapsed_time", 0)
-                existing.total_elevation_gain = activity_data.get("total_elevation_gain")
-                existing.average_speed = activity_data.get("average_speed")
-                existing.max_speed = activity_data.get("max_speed")
-                existing.trainer = activity_data.get("trainer", False)
-                existing.commute = activity_data.get("commute", False)
-                existing.manual = activity_data.get("manual", False)
-                existing.private = activity_data.get("private", False)
-                existing.external_id = activity_data.get("external_id")
-                existing.device_name = activity_data.get("device_name")
-                existing.gear_id = gear_id
-                existing.strava_gear_id = strava_gear_id
-                existing.synced_at = datetime.utcnow()
-                updated_count += 1
-            else:
-                # Create new activity
-                start_date_str = activity_data.get("start_date")
-                start_date = (
-                    datetime.fromisoformat(start_date_str.replace("Z", "+00:00"))
-                    if start_date_str
-                    else datetime.utcnow()
-                )
+    async def write_batch(rows):
+        result = await upsert_activities(db, rows)
+        advance_sync_cursor(state, latest_start_date(rows))
+        if result.changed_rows:
+            await invalidate_user(db, user.id)
+        await db.commit()
+        return result.counts()
 
-                new_activity = Activity(
-                    strava_activity_id=strava_id,
-                    user_id=user.id,
-                    name=activity_data.get("name", "Untitled"),
-                    activity_type=activity_data.get("type", "Unknown"),
-                    sport_type=activity_data.get("sport_type"),
-                    start_date=start_date,
-                    distance=activity_data.get("distance", 0),
-                    moving_time=activity_data.get("moving_time", 0),
-                    elapsed_time=activity_data.get("elapsed_time", 0),
-                    total_elevation_gain=activity_data.get("total_elevation_gain"),
-                    average_speed=activity_data.get("average_speed"),
-                    max_speed=activity_data.get("max_speed"),
-                    trainer=activity_data.get("trainer", False),
-                    commute=activity_data.get("commute", False),
-                    manual=activity_data.get("manual", False),
-                    private=activity_data.get("private", False),
-                    external_id=activity_data.get("external_id"),
-                    device_name=activity_data.get("device_name"),
-                    gear_id=gear_id,
-                    strava_gear_id=strava_gear_id,
-                )
-                db.add(new_activity)
-                created_count += 1
+    pipeline = SyncPipeline(user.id, equipment_map, write_batch)
+    return await pipeline.run(fetch_pages())
 
-            synced_count += 1
 
-        await db.commit()
-        page += 1
+@router.post("/sync")
+async def sync_activities(
+    days: int | None = Query(None, le=365),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Sync activities from Strava.
+
+    By default only activities newer than the user's sync cursor are fetched.
+    Pass `days` to re-read a fixed window instead.
+    """
+    state = await get_sync_state(db, user.id)
+    now = datetime.utcnow()
+
+    # Calculate date range
+    if days:
+        after = now - timedelta(days=days)
+    elif state.latest_activity_at:
+        # Re-read a short overlap so late uploads of older activities are not missed
+        after = state.latest_activity_at - timedelta(hours=settings.sync_cursor_overlap_hours)
+    else:
+        after = now - timedelta(days=settings.sync_default_days)
 
-        # Stop if we got less than a full page
-        if len(activities) < 50:
-            break
+    totals = await sync_activities_after(db, user, state, after)
+
+    state.last_synced_at = now
+    await db.commit()
 
     return {
         "message": "Sync completed",
-        "synced": synced_count,
-        "created": created_count,
-        "updated": updated_count,
+        "synced": totals["activities"],
+        "created": totals["created"],
+        "updated": totals["updated"],
+        "unchanged": totals["unchanged"],
+        "after": after.isoformat(),
     }
 
 
+@router.post("/sync/recent-edits")
+async def sync_recent_edits(
+    days: int = Query(30, le=365),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Re-read the last `days` of activities to pick up renames and gear changes
+    made on Strava since they were first synced. Meant to run rarely.
+    """
+    state = await get_sync_state(db, user.id)
+    now = datetime.utcnow()
+
+    totals = await sync_activities_after(db, user, state, now - timedelta(days=days))
+
+    state.last_synced_at = now
+    state.last_edits_sweep_at = now
+    await db.commit()
+
+    return {
+        "message": "Recent edits sync completed",
+        "synced": totals["activities"],
+        "created": totals["created"],
+        "updated": totals["updated"],
+        "unchanged": totals["unchanged"],
+    }
+
+
+@router.post("/import")
+async def import_archive(
+    archive: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Import activities from a Strava bulk export ZIP without any API calls.
+    Gear is matched by name, so sync equipment first. Activities that are
+    already stored are left as they are.
+    """
+    try:
+        totals = await import_strava_archive(db, user.id, archive.file)
+    except ArchiveImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"message": "Import completed", **totals}
+
+
 @router.post("/bulk-update")
 async def bulk_update_equipment(
     update: ActivityBulkUpdate,
@@ -351,47 +488,75 @@ async def bulk_update_equipment(
     if not activities:
         raise HTTPException(status_code=404, detail="No activities found")
 
+    # Release the write connection while we talk to Strava
+    await db.commit()
+
     strava = StravaService(user.access_token)
-    updated_count = 0
+    updated = []
     errors = []
+    updated_days = set()
 
     for activity in activities:
         try:
             await strava.update_activity(
                 activity.strava_activity_id, gear_id=equipment.strava_gear_id
             )
-            activity.gear_id = equipment.id
-            activity.strava_gear_id = equipment.strava_gear_id
-            updated_count += 1
+            updated.append(activity)
+            updated_days |= activity_days(activity.start_date)
         except Exception as e:
             errors.append({"activity_id": activity.id, "error": str(e)})
 
+    # Write the updates in one short transaction
+    for activity in updated:
+        activity.gear_id = equipment.id
+        activity.strava_gear_id = equipment.strava_gear_id
+        activity.content_hash = None
+    await refresh_rollups(db, user.id, updated_days)
+    await invalidate_user(db, user.id)
     await db.commit()
 
     return {
         "message": "Bulk update completed",
-        "updated": updated_count,
+        "updated": len(updated),
         "errors": errors,
     }
 
 
-async def run_backfill(user_id: int, access_token: str, refresh_token: str):
-    """Background task to backfill all historical activities."""
-    global backfill_status
+async def run_backfill(job: JobRun):
+    """
+    Background task to backfill all historical activities.
 
-    backfill_status[user_id] = {
-        "status": "running",
-        "started_at": datetime.utcnow().isoformat(),
-        "pages_processed": 0,
-        "activities_found": 0,
-        "created": 0,
-        "updated": 0,
-        "errors": [],
-        "completed_at": None,
-    }
+    Pages are fetched with a fixed `before` date and a page number. After
+    each committed page the next position is checkpointed on the job in the
+    same transaction, so a resumed job continues exactly where it stopped.
+    """
+    user_id = job.user_id
+    checkpoint = job.checkpoint or {}
 
-    current_access_token = access_token
-    current_refresh_token = refresh_token
+    async with async_session() as db:
+        user = await db.get(User, user_id)
+        current_access_token = user.access_token
+        current_refresh_token = user.refresh_token
+
+        # Get equipment mapping
+        eq_result = await db.execute(
+            select(Equipment).where(Equipment.user_id == user_id)
+        )
+        equipment_map = {eq.strava_gear_id: eq.id for eq in eq_result.scalars().all()}
+
+        if checkpoint:
+            before_date = (
+                datetime.fromisoformat(checkpoint["before"]) if checkpoint["before"] else None
+            )
+        else:
+            # Find oldest activity to continue from where we left off
+            oldest_result = await db.execute(
+                select(Activity.start_date)
+                .where(Activity.user_id == user_id)
+                .order_by(Activity.start_date.asc())
+                .limit(1)
+            )
+            before_date = oldest_result.scalar_one_or_none()
 
     async def refresh_strava_token():
         """Refresh the Strava token and update in database."""
@@ -413,201 +578,207 @@ async def run_backfill(user_id: int, access_token: str, refresh_token: str):
                     await token_db.commit()
             return True
         except Exception as e:
-            backfill_status[user_id]["errors"].append(f"Token refresh failed: {str(e)}")
+            job.add_error(f"Token refresh failed: {str(e)}")
             return False
 
     strava = StravaService(current_access_token)
 
-    try:
+    # Only fetch activities older than our oldest stored activity
+    if before_date:
+        job.message = f"Fetching activities before {before_date.strftime('%Y-%m-%d')}"
+
+    settings = get_settings()
+    memory_limit_mb = settings.backfill_memory_limit_mb
+    # The limit applies to growth during this run: freed memory is rarely
+    # returned to the OS, so RSS left over from earlier work would pause
+    # every later backfill after its first page
+    baseline_rss_mb = process_rss_mb()
+    first_page = checkpoint.get("next_page", 1)
+    counters = {key: checkpoint.get(key, 0) for key in BACKFILL_COUNTERS}
+    pages_written = 0
+    paused = False
+
+    async def fetch_pages():
+        nonlocal strava
+        page = first_page
+        retries = 0
+        while not paused:
+            try:
+                # Fetch activities older than our oldest stored activity
+                activities = await strava.get_athlete_activities(
+                    before=before_date, page=page, per_page=100
+                )
+            except Exception as e:
+                error_msg = f"Page {page}: [{type(e).__name__}] {str(e)}"
+
+                # If rate limited, wait and retry
+                if "429" in str(e) or "rate" in str(e).lower():
+                    job.add_error(f"Rate limited at page {page}, waiting 15 minutes...")
+                    await job.set_status("rate_limited")
+                    await job.sleep(900)  # Wait 15 minutes
+                    await job.set_status("running")
+                    continue
+
+                # If auth error, try to refresh token
+                if "401" in str(e) or "unauthorized" in str(e).lower():
+                    job.add_error(f"Token expired at page {page}, attempting refresh...")
+                    if await refresh_strava_token():
+                        strava = StravaService(current_access_token)
+                        continue  # Retry the same page with new token
+                    else:
+                        job.status = "error"
+                        job.add_error("Token refresh failed. Please reconnect to Strava.")
+                        return
+
+                # Other error - back off and retry the same page, then give up
+                # (starting the backfill again resumes from the checkpoint)
+                if retries < settings.backfill_max_retries:
+                    delay = BACKFILL_RETRY_DELAY_SECONDS * 2 ** retries
+                    retries += 1
+                    job.add_error(f"{error_msg}; retrying in {delay}s")
+                    await job.sleep(delay)
+                    continue
+                job.status = "error"
+                job.add_error(error_msg)
+                return
+
+            retries = 0
+            if not activities:
+                return
+
+            yield activities
+            page += 1
+
+            # Stop if we got less than a full page
+            if len(activities) < 100:
+                return
+
+            # Respect rate limits - small delay between pages
+            await asyncio.sleep(0.5)
+
+    async def write_batch(rows):
+        nonlocal paused, pages_written
+        # A session per batch, so nothing loaded for one page outlives it
         async with async_session() as db:
-            # Get equipment mapping
-            eq_result = await db.execute(
-                select(Equipment).where(Equipment.user_id == user_id)
-            )
-            equipment_map = {eq.strava_gear_id: eq for eq in eq_result.scalars().all()}
+            result = await upsert_activities(db, rows, bulk_copy=True)
+            state = await get_sync_state(db, user_id)
+            advance_sync_cursor(state, latest_start_date(rows))
+
+            # Pages reach the writer in fetch order, one batch per page
+            counts = result.counts()
+            pages_written += 1
+            counters["pages_processed"] += 1
+            counters["activities_found"] += len(rows)
+            for key, value in counts.items():
+                counters[key] += value
+            await save_checkpoint(db, job, {
+                "before": before_date.isoformat() if before_date else None,
+                "next_page": first_page + pages_written,
+                **counters,
+            })
+
+            if result.changed_rows:
+                await invalidate_user(db, user_id)
+            await db.commit()
+            objects_held = len(db.identity_map)
+
+        job["objects_held"] = objects_held
+        job["peak_objects_held"] = max(job["peak_objects_held"], objects_held)
+        rss_mb = process_rss_mb()
+        job["memory_mb"] = round(rss_mb, 1)
+        job["memory_growth_mb"] = round(rss_mb - baseline_rss_mb, 1)
+        if memory_limit_mb and job["memory_growth_mb"] > memory_limit_mb:
+            # Everything written so far is committed and checkpointed; starting
+            # the backfill again resumes from here
+            paused = True
+        return counts
+
+    async def update_progress(totals):
+        job.progress.update(counters)
+        await job.update()
+
+    pipeline = SyncPipeline(user_id, equipment_map, write_batch, on_progress=update_progress)
+    await pipeline.run(fetch_pages())
+
+    if paused and job.status != "error":
+        job.status = "paused"
+        job.message = (
+            f"Paused after memory grew by {job['memory_growth_mb']} MB "
+            f"(limit {memory_limit_mb} MB); start the backfill again to continue"
+        )
 
-            # Find oldest activity to continue from where we left off
-            oldest_result = await db.execute(
-                select(Activity.start_date)
-                .where(Activity.user_id == user_id)
-                .order_by(Activity.start_date.asc())
-                .limit(1)
+
+async def resume_backfills():
+    """
+    Queue every user's latest backfill that was interrupted by a restart,
+    including one still marked active by a process that died without
+    recording it, once its heartbeat has expired.
+    """
+    async with async_session() as db:
+        await expire_jobs(db)
+        result = await db.execute(
+            select(Job.id, Job.user_id).where(
+                Job.kind == "backfill", Job.status == "interrupted"
             )
-            oldest_date = oldest_result.scalar_one_or_none()
-
-            # Use before parameter to only fetch activities older than our oldest
-            before_date = oldest_date if oldest_date else None
-            if before_date:
-                backfill_status[user_id]["message"] = f"Fetching activities before {before_date.strftime('%Y-%m-%d')}"
-
-            page = 1
-            total_created = 0
-            total_updated = 0
-
-            while True:
-                try:
-                    # Fetch activities older than our oldest stored activity
-                    activities = await strava.get_athlete_activities(
-                        before=before_date, page=page, per_page=100
-                    )
-                except Exception as e:
-                    error_msg = f"Page {page}: [{type(e).__name__}] {str(e)}"
-
-                    # If rate limited, wait and retry
-                    if "429" in str(e) or "rate" in str(e).lower():
-                        backfill_status[user_id]["status"] = "rate_limited"
-                        backfill_status[user_id]["errors"].append(f"Rate limited at page {page}, waiting 15 minutes...")
-                        await asyncio.sleep(900)  # Wait 15 minutes
-                        backfill_status[user_id]["status"] = "running"
-                        continue
-
-                    # If auth error, try to refresh token
-                    if "401" in str(e) or "unauthorized" in str(e).lower():
-                        backfill_status[user_id]["errors"].append(f"Token expired at page {page}, attempting refresh...")
-                        if await refresh_strava_token():
-                            strava = StravaService(current_access_token)
-                            continue  # Retry the same page with new token
-                        else:
-                            backfill_status[user_id]["status"] = "error"
-                            backfill_status[user_id]["errors"].append("Token refresh failed. Please reconnect to Strava.")
-                            return
-
-                    # Other error - log and stop
-                    backfill_status[user_id]["errors"].append(error_msg)
-                    break
-
-                if not activities:
-                    break
-
-                for activity_data in activities:
-                    strava_id = activity_data["id"]
-
-                    # Check if activity exists
-                    result = await db.execute(
-                        select(Activity).where(
-                            Activity.strava_activity_id == strava_id,
-                            Activity.user_id == user_id,
-                        )
-                    )
-                    existing = result.scalar_one_or_none()
-
-                    # Map gear
-                    strava_gear_id = activity_data.get("gear_id")
-                    gear_id = None
-                    if strava_gear_id and strava_gear_id in equipment_map:
-                        gear_id = equipment_map[strava_gear_id].id
-
-                    if existing:
-                        # Update existing
-                        existing.name = activity_data.get("name", existing.name)
-                        existing.activity_type = activity_data.get("type", existing.activity_type)
-                        existing.sport_type = activity_data.get("sport_type")
-                        existing.distance = activity_data.get("distance", 0)
-                        existing.moving_time = activity_data.get("moving_time", 0)
-                        existing.elapsed_time = activity_data.get("elapsed_time", 0)
-                        existing.total_elevation_gain = activity_data.get("total_elevation_gain")
-                        existing.average_speed = activity_data.get("average_speed")
-                        existing.max_speed = activity_data.get("max_speed")
-                        existing.trainer = activity_data.get("trainer", False)
-                        existing.commute = activity_data.get("commute", False)
-                        existing.manual = activity_data.get("manual", False)
-                        existing.private = activity_data.get("private", False)
-                        existing.external_id = activity_data.get("external_id")
-                        existing.device_name = activity_data.get("device_name")
-                        existing.gear_id = gear_id
-                        existing.strava_gear_id = strava_gear_id
-                        existing.synced_at = datetime.utcnow()
-                        total_updated += 1
-                    else:
-                        # Create new
-                        start_date_str = activity_data.get("start_date")
-                        start_date = (
-                            datetime.fromisoformat(start_date_str.replace("Z", "+00:00"))
-                            if start_date_str
-                            else datetime.utcnow()
-                        )
-
-                        new_activity = Activity(
-                            strava_activity_id=strava_id,
-                            user_id=user_id,
-                            name=activity_data.get("name", "Untitled"),
-                            activity_type=activity_data.get("type", "Unknown"),
-                            sport_type=activity_data.get("sport_type"),
-                            start_date=start_date,
-                            distance=activity_data.get("distance", 0),
-                            moving_time=activity_data.get("moving_time", 0),
-                            elapsed_time=activity_data.get("elapsed_time", 0),
-                            total_elevation_gain=activity_data.get("total_elevation_gain"),
-                            average_speed=activity_data.get("average_speed"),
-                            max_speed=activity_data.get("max_speed"),
-                            trainer=activity_data.get("trainer", False),
-                            commute=activity_data.get("commute", False),
-                            manual=activity_data.get("manual", False),
-                            private=activity_data.get("private", False),
-                            external_id=activity_data.get("external_id"),
-                            device_name=activity_data.get("device_name"),
-                            gear_id=gear_id,
-                            strava_gear_id=strava_gear_id,
-                        )
-                        db.add(new_activity)
-                        total_created += 1
-
-                await db.commit()
-
-                # Update status
-                backfill_status[user_id]["pages_processed"] = page
-                backfill_status[user_id]["activities_found"] += len(activities)
-                backfill_status[user_id]["created"] = total_created
-                backfill_status[user_id]["updated"] = total_updated
-
-                page += 1
-
-                # Respect rate limits - small delay between pages
-                await asyncio.sleep(0.5)
-
-                # Stop if we got less than a full page
-                if len(activities) < 100:
-                    break
-
-            backfill_status[user_id]["status"] = "completed"
-            backfill_status[user_id]["completed_at"] = datetime.utcnow().isoformat()
+        )
+        interrupted = result.all()
+        latest = {}
+        for _, user_id in interrupted:
+            latest_backfill = await latest_job(db, user_id, "backfill")
+            latest[user_id] = latest_backfill.id
 
-    except Exception as e:
-        backfill_status[user_id]["status"] = "error"
-        backfill_status[user_id]["errors"].append(str(e))
+    for job_id, user_id in interrupted:
+        if latest[user_id] != job_id:
+            continue  # superseded by a newer backfill
+        job = await resume_job(job_id)
+        if job is not None:
+            await get_job_scheduler().submit(job, run_backfill, priority=JobPriority.BULK)
 
 
 @router.post("/backfill")
 async def start_backfill(
-    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
-    """Start a background task to backfill all historical activities from Strava."""
-    # Check if already running
-    if user.id in backfill_status and backfill_status[user.id]["status"] == "running":
-        raise HTTPException(
-            status_code=409,
-            detail="Backfill already in progress"
-        )
+    """
+    Start a background task to backfill all historical activities from
+    Strava, resuming the previous backfill if it did not finish.
+    """
+    previous = await latest_job(db, user.id, "backfill")
+    job = None
+    # A stale active job counts as interrupted and resumes too
+    if previous is not None and job_status(previous)["status"] in RESUMABLE_STATUSES:
+        job = await resume_job(previous.id)
+    if job is None:
+        try:
+            job = await create_job(user.id, "backfill", progress=BACKFILL_PROGRESS)
+        except JobConflictError:
+            raise HTTPException(
+                status_code=409,
+                detail="Backfill already in progress"
+            )
 
-    # Start background task
-    background_tasks.add_task(run_backfill, user.id, user.access_token, user.refresh_token)
+    # Queue the job behind interactive work
+    await get_job_scheduler().submit(job, run_backfill, priority=JobPriority.BULK)
 
     return {
-        "message": "Backfill started",
+        "message": "Backfill resumed" if job.checkpoint else "Backfill started",
+        "job_id": job.id,
         "status_url": "/api/activities/backfill/status"
     }
 
 
 @router.get("/backfill/status")
 async def get_backfill_status(
+    db: AsyncSession = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
     """Get the current status of the backfill process."""
-    if user.id not in backfill_status:
+    job = await latest_job(db, user.id, "backfill")
+    if job is None:
         return {
             "status": "not_started",
             "message": "No backfill has been started"
         }
 
-    return backfill_status[user.id]
+    return job_status(job)
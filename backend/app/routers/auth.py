@@ -2,9 +2,9 @@ from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import RedirectResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 
-from app.database import get_db
+from app.database import get_db, get_read_db, async_session, read_session
 from app.config import get_settings
 from app.models.user import User
 from app.schemas.user import UserResponse, AuthStatus
@@ -151,7 +151,7 @@ async def logout():
     return {"message": "Logged out successfully"}
 
 
-async def get_current_user(db: AsyncSession = Depends(get_db)) -> User:
+async def get_current_user(db: AsyncSession = Depends(get_read_db)) -> User:
     """Dependency to get the current authenticated user."""
     global _current_user_id
 
@@ -168,13 +168,37 @@ async def get_current_user(db: AsyncSession = Depends(get_db)) -> User:
     if user.is_token_expired() and user.refresh_token:
         try:
             token_data = await StravaService.refresh_access_token(user.refresh_token)
-            user.access_token = token_data.get("access_token")
-            user.refresh_token = token_data.get("refresh_token")
-            user.token_expires_at = datetime.fromtimestamp(
-                token_data.get("expires_at", 0)
-            )
-            await db.commit()
         except Exception:
             raise HTTPException(status_code=401, detail="Token refresh failed")
 
+        values = {
+            "access_token": token_data.get("access_token"),
+            "refresh_token": token_data.get("refresh_token"),
+            "token_expires_at": datetime.fromtimestamp(token_data.get("expires_at", 0)),
+        }
+        # The lookup session may be read-only, so persist through the writer
+        async with async_session() as write_db:
+            await write_db.execute(
+                update(User).where(User.id == user.id).values(**values)
+            )
+            await write_db.commit()
+
+        # Detach before updating so the read session never tries to flush it
+        db.expunge(user)
+        for key, value in values.items():
+            setattr(user, key, value)
+
+    return user
+
+
+async def get_streaming_user() -> User:
+    """
+    `get_current_user` for streaming responses. A request-scoped session
+    stays open until the response body has been sent, so this looks the
+    user up in a session that is closed before the dependency returns.
+    """
+    async with read_session() as db:
+        user = await get_current_user(db)
+        if user in db:
+            db.expunge(user)
     return user
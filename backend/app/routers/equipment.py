@@ -4,21 +4,28 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, extract
 
-from app.database import get_db
+from app.database import get_db, get_read_db, month_bucket
 from app.models.user import User
 from app.models.equipment import Equipment
-from app.models.activity import Activity
+from app.models.rollup import GearUsageRollup
 from app.schemas.equipment import EquipmentResponse, EquipmentStats
 from app.routers.auth import get_current_user
+from app.routers.etag import check_etag
 from app.services.strava import StravaService
+from app.services.cache import cached_response, invalidate_user
 
 router = APIRouter(prefix="/equipment", tags=["equipment"])
 
 
-@router.get("", response_model=list[EquipmentResponse])
+@router.get(
+    "",
+    response_model=list[EquipmentResponse],
+    dependencies=[Depends(check_etag)],
+)
+@cached_response
 async def get_equipment(
     include_retired: bool = False,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
     """Get all equipment for the current user."""
@@ -35,32 +42,49 @@ async def get_equipment(
     return [EquipmentResponse.model_validate(eq) for eq in equipment]
 
 
-@router.get("/stats", response_model=list[EquipmentStats])
+@router.get(
+    "/stats",
+    response_model=list[EquipmentStats],
+    dependencies=[Depends(check_etag)],
+)
+@cached_response
 async def get_equipment_stats(
     include_retired: bool = False,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
     """Get equipment with usage statistics."""
-    query = select(Equipment).where(Equipment.user_id == user.id)
+    # Sum every piece of gear's daily rollups in a single grouped pass
+    activity_stats = (
+        select(
+            GearUsageRollup.gear_id.label("gear_id"),
+            func.sum(GearUsageRollup.activity_count).label("count"),
+            func.sum(GearUsageRollup.moving_time).label("total_time"),
+            func.sum(GearUsageRollup.distance).label("total_distance"),
+            func.sum(GearUsageRollup.elevation_gain).label("total_elevation_gain"),
+            func.max(GearUsageRollup.last_start_date).label("last_used"),
+        )
+        .where(GearUsageRollup.user_id == user.id, GearUsageRollup.gear_id.isnot(None))
+        .group_by(GearUsageRollup.gear_id)
+        .subquery()
+    )
+
+    query = (
+        select(Equipment, activity_stats)
+        .outerjoin(activity_stats, activity_stats.c.gear_id == Equipment.id)
+        .where(Equipment.user_id == user.id)
+    )
 
     if not include_retired:
         query = query.where(Equipment.is_retired == False)
 
     result = await db.execute(query)
-    equipment_list = result.scalars().all()
 
     stats = []
-    for eq in equipment_list:
-        # Get activity stats
-        activity_query = select(
-            func.count(Activity.id).label("count"),
-            func.sum(Activity.moving_time).label("total_time"),
-            func.max(Activity.start_date).label("last_used"),
-        ).where(Activity.gear_id == eq.id)
-
-        activity_result = await db.execute(activity_query)
-        activity_stats = activity_result.one()
+    for row in result.all():
+        eq = row.Equipment
+        total_time = row.total_time or 0
+        total_distance = row.total_distance or 0
 
         stats.append(
             EquipmentStats(
@@ -73,19 +97,23 @@ async def get_equipment_stats(
                 distance=eq.distance,
                 is_primary=eq.is_primary,
                 is_retired=eq.is_retired,
-                activity_count=activity_stats.count or 0,
-                total_time=activity_stats.total_time or 0,
-                last_used=activity_stats.last_used,
+                activity_count=row.count or 0,
+                total_time=total_time,
+                last_used=row.last_used,
+                total_distance=total_distance,
+                total_elevation_gain=row.total_elevation_gain or 0,
+                average_speed=total_distance / total_time if total_time else None,
             )
         )
 
     return stats
 
 
-@router.get("/usage-history")
+@router.get("/usage-history", dependencies=[Depends(check_etag)])
+@cached_response
 async def get_equipment_usage_history(
-    months: int = Query(6, le=12),
-    db: AsyncSession = Depends(get_db),
+    months: int = Query(6, ge=1, le=120),
+    db: AsyncSession = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
     """Get monthly equipment usage history for charts."""
@@ -101,25 +129,28 @@ async def get_equipment_usage_history(
     now = datetime.utcnow()
     start_date = now - timedelta(days=months * 30)
 
-    # Get activities in date range
-    activities_result = await db.execute(
-        select(Activity)
+    # Roll the daily totals up into months in the database
+    month = month_bucket(GearUsageRollup.day, db.get_bind().dialect.name).label("month")
+    usage_result = await db.execute(
+        select(
+            GearUsageRollup.gear_id,
+            month,
+            func.sum(GearUsageRollup.distance).label("distance"),
+        )
         .where(
-            Activity.user_id == user.id,
-            Activity.start_date >= start_date,
-            Activity.gear_id.isnot(None),
+            GearUsageRollup.user_id == user.id,
+            GearUsageRollup.day >= start_date.date(),
+            GearUsageRollup.gear_id.isnot(None),
         )
+        .group_by(GearUsageRollup.gear_id, month)
     )
-    activities = activities_result.scalars().all()
 
-    # Aggregate by month and equipment
     usage_data = defaultdict(lambda: defaultdict(float))
 
-    for activity in activities:
-        if activity.gear_id not in equipment_map:
+    for gear_id, month_key, distance in usage_result.all():
+        if gear_id not in equipment_map:
             continue
-        month_key = activity.start_date.strftime("%Y-%m")
-        usage_data[activity.gear_id][month_key] += activity.distance / 1000  # Convert to km
+        usage_data[gear_id][month_key] = (distance or 0) / 1000  # Convert to km
 
     # Generate month labels for the range
     month_labels = []
@@ -149,10 +180,14 @@ async def get_equipment_usage_history(
     }
 
 
-@router.get("/{equipment_id}", response_model=EquipmentResponse)
+@router.get(
+    "/{equipment_id}",
+    response_model=EquipmentResponse,
+    dependencies=[Depends(check_etag)],
+)
 async def get_equipment_by_id(
     equipment_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
     """Get a specific piece of equipment by ID."""
@@ -231,6 +266,7 @@ async def sync_equipment(
 
         synced_count += 1
 
+    await invalidate_user(db, user.id)
     await db.commit()
 
     return {
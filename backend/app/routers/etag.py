@@ -0,0 +1,55 @@
+import hashlib
+from datetime import datetime
+from fastapi import Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_read_db
+from app.models.user import User
+from app.routers.auth import get_current_user
+from app.services.cache import data_version
+
+CACHE_CONTROL = "private, no-cache"
+
+
+class NotModified(Exception):
+    def __init__(self, etag: str):
+        self.etag = etag
+
+
+async def not_modified_handler(request: Request, exc: NotModified) -> Response:
+    return Response(
+        status_code=304, headers={"ETag": exc.etag, "Cache-Control": CACHE_CONTROL}
+    )
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+async def check_etag(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Dependency for GET endpoints whose response depends only on the user's
+    data. The tag is derived from the user's data version (bumped by every
+    write, in the database), so a matching If-None-Match is answered with
+    304 before the endpoint runs, whichever process serves it. Tags also
+    roll over daily, like the response cache.
+    """
+    today = datetime.utcnow().date().isoformat()
+    version = f"{user.id}:{await data_version(db, user.id)}:{today}"
+    digest = hashlib.sha256(
+        f"{version}:{request.url.path}?{request.url.query}".encode()
+    ).hexdigest()[:32]
+    etag = f'"{digest}"'
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _matches(if_none_match, etag):
+        raise NotModified(etag)
+
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
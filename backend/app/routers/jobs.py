@@ -0,0 +1,59 @@
+import asyncio
+from fastapi import APIRouter, Depends, Header
+from fastapi.responses import StreamingResponse
+
+from app.config import get_settings
+from app.models.user import User
+from app.routers.auth import get_streaming_user
+from app.services.job_events import get_job_event_broker
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+# Reconnect delay suggested to EventSource clients
+EVENTS_RETRY_MS = 3000
+
+
+@router.get("/events")
+async def job_events(
+    last_event_id: str | None = Header(None),
+    user: User = Depends(get_streaming_user),
+):
+    """
+    Stream the user's job progress as Server-Sent Events. Reconnecting
+    clients send Last-Event-ID and receive the events they missed, or a
+    `reset` event when those are gone and status should be re-read.
+    """
+    broker = get_job_event_broker()
+    heartbeat_seconds = get_settings().job_events_heartbeat_seconds
+    user_id = user.id
+
+    async def stream():
+        with broker.subscribe(user_id) as queue:
+            yield f"retry: {EVENTS_RETRY_MS}\n\n"
+
+            # Events published since subscribing are both queued and replayed
+            replayed_through = 0
+            missed = broker.replay(user_id, last_event_id)
+            if missed is None:
+                yield broker.reset_event().encode()
+            else:
+                for event in missed:
+                    yield event.encode()
+                    replayed_through = event.sequence
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    # Comment line; keeps proxies from closing an idle stream
+                    yield ": heartbeat\n\n"
+                    continue
+                if event.sequence <= replayed_through:
+                    continue
+                yield event.encode()
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
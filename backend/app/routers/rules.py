@@ -1,11 +1,13 @@
 import asyncio
+from collections import defaultdict
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from typing import NamedTuple
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.orm import selectinload
 
-from app.database import get_db, async_session
+from app.database import get_db, get_read_db, async_session
 from app.models.user import User
 from app.models.rule import Rule, RuleCondition
 from app.models.equipment import Equipment
@@ -18,18 +20,36 @@ from app.schemas.rule import (
     RulePreviewActivity,
 )
 from app.routers.auth import get_current_user
+from app.routers.etag import check_etag
 from app.services.rule_engine import RuleEngine
 from app.services.strava import StravaService
+from app.services.rollups import activity_days, refresh_rollups
+from app.services.cache import cached_response, invalidate_user
+from app.services.activity_cache import get_activity_records, stream_activity_records
+from app.services.jobs import JobConflictError, JobRun, create_job, job_status, latest_job
+from app.services.scheduler import JobPriority, get_job_scheduler
 
 router = APIRouter(prefix="/rules", tags=["rules"])
 
-# In-memory status tracking for rule application jobs
-rule_apply_status: dict[str, dict] = {}
+# Counters reported by rule apply jobs
+RULE_APPLY_PROGRESS = {"total": 0, "processed": 0, "updated": 0, "skipped": 0}
 
 
-@router.get("", response_model=list[RuleResponse])
+class PendingUpdate(NamedTuple):
+    """A gear change a rule apply job holds on to until it is written."""
+
+    id: int
+    strava_activity_id: int
+    name: str
+    start_date: datetime
+    gear_id: int
+    strava_gear_id: str
+
+
+@router.get("", response_model=list[RuleResponse], dependencies=[Depends(check_etag)])
+@cached_response
 async def get_rules(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
     """Get all rules for the current user."""
@@ -47,7 +67,8 @@ async def get_rules(
     )
     all_equipment = all_equipment_result.scalars().all()
     equipment_map = {eq.id: eq.name for eq in all_equipment}
-    RuleEngine.set_equipment_map(equipment_map)
+
+    activities = await get_activity_records(db, user.id)
 
     # Get equipment names and matching counts
     response = []
@@ -73,19 +94,10 @@ async def get_rules(
             "updated_at": rule.updated_at,
         }
 
-        # Get equipment name
-        eq_result = await db.execute(
-            select(Equipment).where(Equipment.id == rule.target_gear_id)
-        )
-        equipment = eq_result.scalar_one_or_none()
-        rule_dict["target_gear_name"] = equipment.name if equipment else None
+        rule_dict["target_gear_name"] = equipment_map.get(rule.target_gear_id)
 
         # Get matching count
-        activities_result = await db.execute(
-            select(Activity).where(Activity.user_id == user.id)
-        )
-        activities = activities_result.scalars().all()
-        matching = RuleEngine.find_matching_activities(activities, rule)
+        matching = RuleEngine.find_matching_activities(activities, rule, equipment_map)
         rule_dict["matching_count"] = len(matching)
 
         response.append(RuleResponse(**rule_dict))
@@ -93,10 +105,14 @@ async def get_rules(
     return response
 
 
-@router.get("/{rule_id}", response_model=RuleResponse)
+@router.get(
+    "/{rule_id}",
+    response_model=RuleResponse,
+    dependencies=[Depends(check_etag)],
+)
 async def get_rule(
     rule_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
     """Get a specific rule by ID."""
@@ -116,16 +132,12 @@ async def get_rule(
     )
     all_equipment = all_equipment_result.scalars().all()
     equipment_map = {eq.id: eq.name for eq in all_equipment}
-    RuleEngine.set_equipment_map(equipment_map)
 
     equipment = next((eq for eq in all_equipment if eq.id == rule.target_gear_id), None)
 
     # Get matching count
-    activities_result = await db.execute(
-        select(Activity).where(Activity.user_id == user.id)
-    )
-    activities = activities_result.scalars().all()
-    matching = RuleEngine.find_matching_activities(activities, rule)
+    activities = await get_activity_records(db, user.id)
+    matching = RuleEngine.find_matching_activities(activities, rule, equipment_map)
 
     return RuleResponse(
         id=rule.id,
@@ -191,6 +203,7 @@ async def create_rule(
         )
         db.add(condition)
 
+    await invalidate_user(db, user.id)
     await db.commit()
     await db.refresh(rule)
 
@@ -281,6 +294,7 @@ async def update_rule(
             )
             db.add(condition)
 
+    await invalidate_user(db, user.id)
     await db.commit()
 
     # Reload rule with conditions
@@ -337,6 +351,7 @@ async def delete_rule(
         raise HTTPException(status_code=404, detail="Rule not found")
 
     await db.delete(rule)
+    await invalidate_user(db, user.id)
     await db.commit()
 
     return {"message": "Rule deleted"}
@@ -345,7 +360,7 @@ async def delete_rule(
 @router.post("/{rule_id}/preview", response_model=RulePreviewResponse)
 async def preview_rule(
     rule_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
     """Preview which activities match a rule."""
@@ -365,18 +380,14 @@ async def preview_rule(
     )
     all_equipment = all_equipment_result.scalars().all()
     equipment_map = {eq.id: eq.name for eq in all_equipment}
-    RuleEngine.set_equipment_map(equipment_map)
 
     target_equipment = next((eq for eq in all_equipment if eq.id == rule.target_gear_id), None)
 
     # Get all activities
-    activities_result = await db.execute(
-        select(Activity).where(Activity.user_id == user.id)
-    )
-    activities = activities_result.scalars().all()
+    activities = await get_activity_records(db, user.id)
 
     # Find matching activities
-    matching = RuleEngine.find_matching_activities(activities, rule)
+    matching = RuleEngine.find_matching_activities(activities, rule, equipment_map)
 
     # Build response
     preview_activities = []
@@ -409,29 +420,19 @@ async def preview_rule(
     )
 
 
-async def run_rule_apply(
-    job_id: str,
-    user_id: int,
-    rule_id: int,
-    activity_ids: list[int] | None,
+async def apply_gear_changes(
+    job: JobRun,
+    db: AsyncSession,
+    changes: list[PendingUpdate],
     access_token: str,
     refresh_token: str,
 ):
-    """Background task to apply a rule to activities."""
-    global rule_apply_status
-
-    rule_apply_status[job_id] = {
-        "status": "running",
-        "rule_id": rule_id,
-        "started_at": datetime.utcnow().isoformat(),
-        "total": 0,
-        "processed": 0,
-        "updated": 0,
-        "skipped": 0,
-        "errors": [],
-        "completed_at": None,
-    }
-
+    """
+    Push gear changes to Strava one activity at a time, waiting out rate
+    limits and refreshing the token when needed, and write the ones that
+    succeeded to the database in batches.
+    """
+    user_id = job.user_id
     current_access_token = access_token
     current_refresh_token = refresh_token
 
@@ -455,150 +456,232 @@ async def run_rule_apply(
                     await token_db.commit()
             return True
         except Exception as e:
-            rule_apply_status[job_id]["errors"].append(f"Token refresh failed: {str(e)}")
+            job.add_error(f"Token refresh failed: {str(e)}")
             return False
 
-    try:
-        async with async_session() as db:
-            # Load rule with conditions
-            result = await db.execute(
-                select(Rule)
-                .where(Rule.id == rule_id, Rule.user_id == user_id)
-                .options(selectinload(Rule.conditions))
+    strava = StravaService(current_access_token)
+    pending_days = set()
+    # (gear_id, strava_gear_id) -> activities updated on Strava so far
+    updated_ids: defaultdict[tuple[int, str], list[int]] = defaultdict(list)
+
+    async def save_progress():
+        """Write the gear for activities updated on Strava so far."""
+        for (gear_id, strava_gear_id), ids in updated_ids.items():
+            await db.execute(
+                update(Activity)
+                .where(Activity.id.in_(ids))
+                .values(gear_id=gear_id, strava_gear_id=strava_gear_id, content_hash=None)
             )
-            rule = result.scalar_one_or_none()
-
-            if not rule:
-                rule_apply_status[job_id]["status"] = "error"
-                rule_apply_status[job_id]["errors"].append("Rule not found")
-                return
+        await refresh_rollups(db, user_id, pending_days)
+        await invalidate_user(db, user_id)
+        await db.commit()
+        updated_ids.clear()
+        pending_days.clear()
 
-            # Get all equipment and build map for rule engine
-            all_equipment_result = await db.execute(
-                select(Equipment).where(Equipment.user_id == user_id)
+    for activity in changes:
+        try:
+            await strava.update_activity(
+                activity.strava_activity_id, gear_id=activity.strava_gear_id
             )
-            all_equipment = all_equipment_result.scalars().all()
-            equipment_map = {eq.id: eq.name for eq in all_equipment}
-            RuleEngine.set_equipment_map(equipment_map)
-
-            target_equipment = next((eq for eq in all_equipment if eq.id == rule.target_gear_id), None)
-
-            if not target_equipment:
-                rule_apply_status[job_id]["status"] = "error"
-                rule_apply_status[job_id]["errors"].append("Target equipment not found")
-                return
-
-            # Get activities to process
-            if activity_ids:
-                activities_result = await db.execute(
-                    select(Activity).where(
-                        Activity.id.in_(activity_ids), Activity.user_id == user_id
+            updated_ids[activity.gear_id, activity.strava_gear_id].append(activity.id)
+            job["updated"] += 1
+        except Exception as e:
+            error_str = str(e)
+            # If auth error, try to refresh token
+            if "401" in error_str or "unauthorized" in error_str.lower():
+                if await refresh_strava_token():
+                    strava = StravaService(current_access_token)
+                    # Retry this activity
+                    try:
+                        await strava.update_activity(
+                            activity.strava_activity_id, gear_id=activity.strava_gear_id
+                        )
+                        updated_ids[activity.gear_id, activity.strava_gear_id].append(activity.id)
+                        job["updated"] += 1
+                    except Exception as retry_e:
+                        job.add_error({
+                            "activity_id": activity.id,
+                            "name": activity.name,
+                            "error": str(retry_e)
+                        })
+                else:
+                    job.status = "error"
+                    job.add_error("Authentication failed")
+                    break
+            # If rate limited, wait and retry
+            elif "429" in error_str or "rate" in error_str.lower():
+                await job.set_status("rate_limited")
+                await job.sleep(900)  # Wait 15 minutes
+                await job.set_status("running")
+                strava = StravaService(current_access_token)
+                # Retry this activity
+                try:
+                    await strava.update_activity(
+                        activity.strava_activity_id, gear_id=activity.strava_gear_id
                     )
-                )
+                    updated_ids[activity.gear_id, activity.strava_gear_id].append(activity.id)
+                    job["updated"] += 1
+                except Exception as retry_e:
+                    job.add_error({
+                        "activity_id": activity.id,
+                        "name": activity.name,
+                        "error": str(retry_e)
+                    })
             else:
-                activities_result = await db.execute(
-                    select(Activity).where(Activity.user_id == user_id)
+                job.add_error({
+                    "activity_id": activity.id,
+                    "name": activity.name,
+                    "error": error_str
+                })
+
+        job["processed"] += 1
+        pending_days |= activity_days(activity.start_date)
+
+        # Commit periodically to save progress
+        if job["processed"] % 10 == 0:
+            await save_progress()
+        await job.update()
+
+        # Small delay to avoid rate limits
+        await asyncio.sleep(0.2)
+
+    await save_progress()
+
+
+async def load_equipment_map(db: AsyncSession, user_id: int) -> dict[int, Equipment]:
+    """Load the user's equipment keyed by ID."""
+    result = await db.execute(select(Equipment).where(Equipment.user_id == user_id))
+    return {eq.id: eq for eq in result.scalars().all()}
+
+
+async def run_rule_apply(
+    job: JobRun,
+    activity_ids: list[int] | None,
+    access_token: str,
+    refresh_token: str,
+):
+    """Background task to apply a rule to activities."""
+    user_id = job.user_id
+    rule_id = job.resource_id
+
+    async with async_session() as db:
+        # Load rule with conditions
+        result = await db.execute(
+            select(Rule)
+            .where(Rule.id == rule_id, Rule.user_id == user_id)
+            .options(selectinload(Rule.conditions))
+        )
+        rule = result.scalar_one_or_none()
+
+        if not rule:
+            job.status = "error"
+            job.add_error("Rule not found")
+            return
+
+        # Get all equipment for the rule engine
+        equipment = await load_equipment_map(db, user_id)
+        equipment_names = {eq.id: eq.name for eq in equipment.values()}
+        target_equipment = equipment.get(rule.target_gear_id)
+
+        if not target_equipment:
+            job.status = "error"
+            job.add_error("Target equipment not found")
+            return
+
+        # Evaluate activities chunk by chunk, keeping only what the
+        # update loop needs for the matches
+        matching: list[PendingUpdate] = []
+        async for records in stream_activity_records(db, user_id, activity_ids):
+            matching.extend(
+                PendingUpdate(
+                    record.id,
+                    record.strava_activity_id,
+                    record.name,
+                    record.start_date,
+                    target_equipment.id,
+                    target_equipment.strava_gear_id,
                 )
+                for record in RuleEngine.find_matching_activities(records, rule, equipment_names)
+            )
 
-            activities = activities_result.scalars().all()
+        if not matching:
+            return
 
-            # Filter to matching activities
-            matching = RuleEngine.find_matching_activities(activities, rule)
+        job["total"] = len(matching)
 
-            if not matching:
-                rule_apply_status[job_id]["status"] = "completed"
-                rule_apply_status[job_id]["completed_at"] = datetime.utcnow().isoformat()
-                return
+        # Release the write connection while we talk to Strava
+        await db.commit()
+        await job.save()
 
-            rule_apply_status[job_id]["total"] = len(matching)
+        await apply_gear_changes(job, db, matching, access_token, refresh_token)
 
-            # Update activities on Strava
-            strava = StravaService(current_access_token)
 
-            for activity in matching:
-                try:
-                    await strava.update_activity(
-                        activity.strava_activity_id, gear_id=target_equipment.strava_gear_id
-                    )
-                    activity.gear_id = target_equipment.id
-                    activity.strava_gear_id = target_equipment.strava_gear_id
-                    rule_apply_status[job_id]["updated"] += 1
-                except Exception as e:
-                    error_str = str(e)
-                    # If auth error, try to refresh token
-                    if "401" in error_str or "unauthorized" in error_str.lower():
-                        if await refresh_strava_token():
-                            strava = StravaService(current_access_token)
-                            # Retry this activity
-                            try:
-                                await strava.update_activity(
-                                    activity.strava_activity_id, gear_id=target_equipment.strava_gear_id
-                                )
-                                activity.gear_id = target_equipment.id
-                                activity.strava_gear_id = target_equipment.strava_gear_id
-                                rule_apply_status[job_id]["updated"] += 1
-                            except Exception as retry_e:
-                                rule_apply_status[job_id]["errors"].append({
-                                    "activity_id": activity.id,
-                                    "name": activity.name,
-                                    "error": str(retry_e)
-                                })
-                        else:
-                            rule_apply_status[job_id]["status"] = "error"
-                            rule_apply_status[job_id]["errors"].append("Authentication failed")
-                            return
-                    # If rate limited, wait and retry
-                    elif "429" in error_str or "rate" in error_str.lower():
-                        rule_apply_status[job_id]["status"] = "rate_limited"
-                        await asyncio.sleep(900)  # Wait 15 minutes
-                        rule_apply_status[job_id]["status"] = "running"
-                        strava = StravaService(current_access_token)
-                        # Retry this activity
-                        try:
-                            await strava.update_activity(
-                                activity.strava_activity_id, gear_id=target_equipment.strava_gear_id
-                            )
-                            activity.gear_id = target_equipment.id
-                            activity.strava_gear_id = target_equipment.strava_gear_id
-                            rule_apply_status[job_id]["updated"] += 1
-                        except Exception as retry_e:
-                            rule_apply_status[job_id]["errors"].append({
-                                "activity_id": activity.id,
-                                "name": activity.name,
-                                "error": str(retry_e)
-                            })
-                    else:
-                        rule_apply_status[job_id]["errors"].append({
-                            "activity_id": activity.id,
-                            "name": activity.name,
-                            "error": error_str
-                        })
+async def run_rule_apply_all(job: JobRun, access_token: str, refresh_token: str):
+    """
+    Background task to apply every active rule in one pass. Each activity
+    gets the gear of the highest-priority rule it matches, and only
+    activities not already on that gear are updated.
+    """
+    user_id = job.user_id
 
-                rule_apply_status[job_id]["processed"] += 1
+    async with async_session() as db:
+        result = await db.execute(
+            select(Rule)
+            .where(Rule.user_id == user_id, Rule.is_active == True)
+            .options(selectinload(Rule.conditions))
+            .order_by(Rule.priority)
+        )
+        rules = result.scalars().all()
+        if not rules:
+            return
+
+        equipment = await load_equipment_map(db, user_id)
+        equipment_names = {eq.id: eq.name for eq in equipment.values()}
+
+        changes: list[PendingUpdate] = []
+        missing_targets = set()
+        async for records in stream_activity_records(db, user_id):
+            for record in records:
+                rule = RuleEngine.find_first_matching_rule(record, rules, equipment_names)
+                if rule is None:
+                    continue
+                target_equipment = equipment.get(rule.target_gear_id)
+                if target_equipment is None:
+                    missing_targets.add(rule.name)
+                elif record.gear_id == target_equipment.id:
+                    job["skipped"] += 1
+                else:
+                    changes.append(
+                        PendingUpdate(
+                            record.id,
+                            record.strava_activity_id,
+                            record.name,
+                            record.start_date,
+                            target_equipment.id,
+                            target_equipment.strava_gear_id,
+                        )
+                    )
 
-                # Commit periodically to save progress
-                if rule_apply_status[job_id]["processed"] % 10 == 0:
-                    await db.commit()
+        for name in sorted(missing_targets):
+            job.add_error(f"Target equipment not found for rule '{name}'")
 
-                # Small delay to avoid rate limits
-                await asyncio.sleep(0.2)
+        if not changes:
+            return
 
-            await db.commit()
+        job["total"] = len(changes)
 
-            rule_apply_status[job_id]["status"] = "completed"
-            rule_apply_status[job_id]["completed_at"] = datetime.utcnow().isoformat()
+        # Release the write connection while we talk to Strava
+        await db.commit()
+        await job.save()
 
-    except Exception as e:
-        rule_apply_status[job_id]["status"] = "error"
-        rule_apply_status[job_id]["errors"].append(str(e))
+        await apply_gear_changes(job, db, changes, access_token, refresh_token)
 
 
 @router.post("/{rule_id}/apply")
 async def apply_rule(
     rule_id: int,
-    background_tasks: BackgroundTasks,
     activity_ids: list[int] | None = None,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
     """Start applying a rule to matching activities (async)."""
@@ -611,31 +694,29 @@ async def apply_rule(
     if not rule:
         raise HTTPException(status_code=404, detail="Rule not found")
 
-    # Generate job ID
-    job_id = f"rule_{rule_id}_{user.id}_{int(datetime.utcnow().timestamp())}"
-
-    # Check if already running
-    for jid, status in rule_apply_status.items():
-        if status.get("rule_id") == rule_id and status.get("status") == "running":
-            raise HTTPException(
-                status_code=409,
-                detail="Rule is already being applied"
-            )
-
-    # Start background task
-    background_tasks.add_task(
+    # Record the job (refused if this rule is already being applied) and
+    # queue it ahead of bulk work
+    try:
+        job = await create_job(
+            user.id, "rule_apply", resource_id=rule_id, progress=RULE_APPLY_PROGRESS
+        )
+    except JobConflictError:
+        raise HTTPException(
+            status_code=409,
+            detail="Rule is already being applied"
+        )
+    await get_job_scheduler().submit(
+        job,
         run_rule_apply,
-        job_id,
-        user.id,
-        rule_id,
         activity_ids,
         user.access_token,
         user.refresh_token,
+        priority=JobPriority.INTERACTIVE,
     )
 
     return {
         "message": "Rule application started",
-        "job_id": job_id,
+        "job_id": job.id,
         "status_url": f"/api/rules/{rule_id}/apply/status"
     }
 
@@ -643,33 +724,58 @@ async def apply_rule(
 @router.get("/{rule_id}/apply/status")
 async def get_apply_status(
     rule_id: int,
+    db: AsyncSession = Depends(get_read_db),
     user: User = Depends(get_current_user),
 ):
     """Get the status of rule application."""
-    # Find the latest job for this rule and user
-    latest_job = None
-    latest_time = None
-
-    for job_id, status in rule_apply_status.items():
-        if status.get("rule_id") == rule_id and job_id.endswith(f"_{user.id}_"):
-            # Actually check properly
-            pass
-
-    # Find matching jobs
-    matching_jobs = [
-        (jid, status) for jid, status in rule_apply_status.items()
-        if status.get("rule_id") == rule_id and f"_{user.id}_" in jid
-    ]
-
-    if not matching_jobs:
+    job = await latest_job(db, user.id, "rule_apply", rule_id)
+    if job is None:
         return {
             "status": "not_started",
             "message": "No apply job found for this rule"
         }
 
-    # Return the most recent job
-    latest_job_id, latest_status = max(matching_jobs, key=lambda x: x[0])
+    return {**job_status(job), "rule_id": rule_id}
+
+
+@router.post("/apply-all")
+async def apply_all_rules(
+    user: User = Depends(get_current_user),
+):
+    """Start applying all active rules in priority order (async)."""
+    try:
+        job = await create_job(user.id, "rule_apply_all", progress=RULE_APPLY_PROGRESS)
+    except JobConflictError:
+        raise HTTPException(
+            status_code=409,
+            detail="Rules are already being applied"
+        )
+    await get_job_scheduler().submit(
+        job,
+        run_rule_apply_all,
+        user.access_token,
+        user.refresh_token,
+        priority=JobPriority.INTERACTIVE,
+    )
+
     return {
-        "job_id": latest_job_id,
-        **latest_status
+        "message": "Rule application started",
+        "job_id": job.id,
+        "status_url": "/api/rules/apply-all/status"
     }
+
+
+@router.get("/apply-all/status")
+async def get_apply_all_status(
+    db: AsyncSession = Depends(get_read_db),
+    user: User = Depends(get_current_user),
+):
+    """Get the status of the latest apply-all job."""
+    job = await latest_job(db, user.id, "rule_apply_all")
+    if job is None:
+        return {
+            "status": "not_started",
+            "message": "Rules have not been applied together yet"
+        }
+
+    return job_status(job)
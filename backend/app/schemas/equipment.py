@@ -44,6 +44,9 @@ class EquipmentStats(BaseModel):
     activity_count: int
     total_time: int  # seconds
     last_used: datetime | None
+    total_distance: float = 0  # meters, summed from synced activities
+    total_elevation_gain: float = 0  # meters
+    average_speed: float | None = None  # meters/second over moving time
 
     class Config:
         from_attributes = True
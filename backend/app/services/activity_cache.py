@@ -0,0 +1,146 @@
+"""
+Compact per-user activity snapshots for rule evaluation.
+
+Rule endpoints evaluate every rule against all of a user's activities. The
+snapshots are loaded with a column-only select into `__slots__` records,
+which cost a fraction of a full ORM `Activity`, and kept in an LRU capped by
+an estimate of their memory use. Entries are tagged with the user's data
+version, which every write path bumps in the database, so a stale snapshot
+is never used, even after a write made by another process.
+"""
+import sys
+from collections import OrderedDict
+from typing import Any, AsyncIterator
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.models.activity import Activity
+from app.services.cache import data_version
+
+# Activity fields available to rule conditions and rule previews
+RECORD_FIELDS = (
+    "id",
+    "strava_activity_id",
+    "name",
+    "activity_type",
+    "sport_type",
+    "start_date",
+    "distance",
+    "moving_time",
+    "elapsed_time",
+    "total_elevation_gain",
+    "average_speed",
+    "max_speed",
+    "trainer",
+    "commute",
+    "manual",
+    "private",
+    "external_id",
+    "device_name",
+    "gear_id",
+    "strava_gear_id",
+)
+
+
+class ActivityRecord:
+    """Read-only activity snapshot holding only `RECORD_FIELDS`."""
+
+    __slots__ = RECORD_FIELDS
+
+    def __init__(self, values):
+        for name, value in zip(RECORD_FIELDS, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("ActivityRecord is read-only")
+
+    def size(self) -> int:
+        """Approximate bytes held by this record and its field values."""
+        return sys.getsizeof(self) + sum(
+            sys.getsizeof(getattr(self, name)) for name in RECORD_FIELDS
+        )
+
+
+class ActivityRecordCache:
+    """LRU of per-user activity snapshots, bounded by total estimated size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # user_id -> (data version, records, size)
+        self._entries: OrderedDict[int, tuple[int, list[ActivityRecord], int]] = OrderedDict()
+
+    def get(self, user_id: int, version: int) -> list[ActivityRecord] | None:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] != version:
+            return None
+        self._entries.move_to_end(user_id)
+        return entry[1]
+
+    def put(self, user_id: int, version: int, records: list[ActivityRecord]):
+        self.discard(user_id)
+        size = sum(record.size() for record in records)
+        if size > self.max_bytes:
+            return  # Larger than the whole cache; always load from the database
+
+        self._entries[user_id] = (version, records, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def discard(self, user_id: int):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self.total_bytes -= entry[2]
+
+
+_record_cache = ActivityRecordCache(get_settings().rule_activity_cache_mb * 1024 * 1024)
+
+
+# Rows fetched per round trip when streaming snapshots
+STREAM_CHUNK_SIZE = 500
+
+
+def _records_select(user_id: int):
+    return select(*(getattr(Activity, name) for name in RECORD_FIELDS)).where(
+        Activity.user_id == user_id
+    )
+
+
+async def load_activity_records(db: AsyncSession, user_id: int) -> list[ActivityRecord]:
+    """Load a user's activity snapshots with a single column-only select."""
+    result = await db.execute(_records_select(user_id))
+    return [ActivityRecord(row) for row in result.all()]
+
+
+async def stream_activity_records(
+    db: AsyncSession,
+    user_id: int,
+    activity_ids: list[int] | None = None,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+) -> AsyncIterator[list[ActivityRecord]]:
+    """
+    Yield a user's activity snapshots in chunks from a server-side cursor,
+    for jobs that only need to look at each activity once.
+    """
+    statement = _records_select(user_id)
+    if activity_ids:
+        statement = statement.where(Activity.id.in_(activity_ids))
+
+    result = await db.stream(statement.execution_options(yield_per=chunk_size))
+    async for partition in result.partitions():
+        yield [ActivityRecord(row) for row in partition]
+
+
+async def get_activity_records(db: AsyncSession, user_id: int) -> list[ActivityRecord]:
+    """Return the user's activity snapshots, from the cache when still current."""
+    # Read before loading so a concurrent write leaves the entry already stale
+    version = await data_version(db, user_id)
+
+    records = _record_cache.get(user_id, version)
+    if records is None:
+        records = await load_activity_records(db, user_id)
+        _record_cache.put(user_id, version, records)
+    return records
@@ -0,0 +1,238 @@
+import hashlib
+import json
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Any
+from sqlalchemy import Column, MetaData, Table, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import dialect_insert
+from app.models.activity import Activity
+from app.models.sync_state import SyncState
+from app.services.rollups import activity_days, refresh_rollups
+
+# Maximum rows per INSERT statement (keeps us well under the bind parameter
+# limits of both SQLite and PostgreSQL)
+UPSERT_CHUNK_SIZE = 500
+
+# Strava-sourced columns; a change in any of them means the row must be rewritten
+CONTENT_HASH_COLUMNS = (
+    "name",
+    "activity_type",
+    "sport_type",
+    "start_date",
+    "distance",
+    "moving_time",
+    "elapsed_time",
+    "total_elevation_gain",
+    "average_speed",
+    "max_speed",
+    "trainer",
+    "commute",
+    "manual",
+    "private",
+    "external_id",
+    "device_name",
+    "gear_id",
+    "strava_gear_id",
+)
+
+# Columns rewritten on every update of an existing activity
+UPSERT_UPDATE_COLUMNS = CONTENT_HASH_COLUMNS + ("content_hash", "synced_at", "updated_at")
+
+# Every column written by an upsert, in `map_strava_activity` order
+UPSERT_INSERT_COLUMNS = ("strava_activity_id", "user_id") + UPSERT_UPDATE_COLUMNS + ("created_at",)
+
+# Session-local PostgreSQL staging table for COPY-based bulk loads
+_copy_stage = Table(
+    "activities_copy_stage",
+    MetaData(),
+    *(Column(name, Activity.__table__.c[name].type) for name in UPSERT_INSERT_COLUMNS),
+    prefixes=["TEMPORARY"],
+    postgresql_on_commit="DELETE ROWS",
+)
+
+
+def parse_strava_datetime(value: str | None) -> datetime:
+    """Parse a Strava ISO-8601 timestamp into a naive UTC datetime."""
+    if not value:
+        return datetime.utcnow()
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def activity_content_hash(row: dict[str, Any]) -> str:
+    """Hash the Strava-sourced fields of a mapped activity row."""
+    payload = json.dumps([row.get(column) for column in CONTENT_HASH_COLUMNS], default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class UpsertResult:
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    # Rows that were actually inserted or updated
+    changed_rows: list[dict[str, Any]] = field(default_factory=list)
+    # Rollup days (old and new start dates) touched by the changed rows
+    affected_days: set[date] = field(default_factory=set)
+
+    def counts(self) -> dict[str, int]:
+        return {"created": self.created, "updated": self.updated, "unchanged": self.unchanged}
+
+
+def map_strava_activity(
+    activity_data: dict[str, Any],
+    user_id: int,
+    equipment_map: dict[str, int],
+) -> dict[str, Any]:
+    """
+    Map a Strava activity summary onto an `activities` row.
+    `equipment_map` maps Strava gear IDs to local equipment IDs.
+    """
+    strava_gear_id = activity_data.get("gear_id")
+    now = datetime.utcnow()
+
+    row = {
+        "strava_activity_id": activity_data["id"],
+        "user_id": user_id,
+        "name": activity_data.get("name") or "Untitled",
+        "activity_type": activity_data.get("type") or "Unknown",
+        "sport_type": activity_data.get("sport_type"),
+        "start_date": parse_strava_datetime(activity_data.get("start_date")),
+        "distance": activity_data.get("distance", 0),
+        "moving_time": activity_data.get("moving_time", 0),
+        "elapsed_time": activity_data.get("elapsed_time", 0),
+        "total_elevation_gain": activity_data.get("total_elevation_gain"),
+        "average_speed": activity_data.get("average_speed"),
+        "max_speed": activity_data.get("max_speed"),
+        "trainer": activity_data.get("trainer", False),
+        "commute": activity_data.get("commute", False),
+        "manual": activity_data.get("manual", False),
+        "private": activity_data.get("private", False),
+        "external_id": activity_data.get("external_id"),
+        "device_name": activity_data.get("device_name"),
+        "gear_id": equipment_map.get(strava_gear_id) if strava_gear_id else None,
+        "strava_gear_id": strava_gear_id,
+        "synced_at": now,
+        "created_at": now,
+        "updated_at": now,
+    }
+    row["content_hash"] = activity_content_hash(row)
+    return row
+
+
+def _on_conflict_update(stmt):
+    """Attach the shared ON CONFLICT(strava_activity_id) DO UPDATE clause."""
+    return stmt.on_conflict_do_update(
+        index_elements=[Activity.strava_activity_id],
+        set_={column: stmt.excluded[column] for column in UPSERT_UPDATE_COLUMNS},
+        where=Activity.content_hash.is_distinct_from(stmt.excluded.content_hash),
+    )
+
+
+async def _copy_upsert(db: AsyncSession, rows: list[dict[str, Any]]):
+    """
+    PostgreSQL bulk path: COPY the rows into a temporary staging table, then
+    merge them with a single INSERT ... SELECT ... ON CONFLICT DO UPDATE.
+    """
+    connection = await db.connection()
+    await connection.run_sync(lambda sync_conn: _copy_stage.create(sync_conn, checkfirst=True))
+    await db.execute(text(f"TRUNCATE {_copy_stage.name}"))
+
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        _copy_stage.name,
+        records=[tuple(row[column] for column in UPSERT_INSERT_COLUMNS) for row in rows],
+        columns=list(UPSERT_INSERT_COLUMNS),
+    )
+
+    stmt = postgresql.insert(Activity).from_select(
+        list(UPSERT_INSERT_COLUMNS), select(_copy_stage)
+    )
+    await db.execute(_on_conflict_update(stmt))
+
+
+async def upsert_activities(
+    db: AsyncSession,
+    rows: list[dict[str, Any]],
+    bulk_copy: bool = False,
+    update_existing: bool = True,
+) -> UpsertResult:
+    """
+    Insert or update a batch of mapped activity rows in a single statement
+    (per chunk) using INSERT ... ON CONFLICT(strava_activity_id) DO UPDATE.
+    With `bulk_copy` on PostgreSQL the rows are loaded with COPY instead.
+    Rows whose content hash matches the stored one are skipped entirely, as
+    are all existing rows when `update_existing` is off.
+    Gear usage rollups for the affected days are refreshed in the same
+    transaction. The caller is responsible for committing.
+    """
+    result = UpsertResult()
+    if not rows:
+        return result
+
+    # Strava occasionally repeats an activity across page boundaries; ON CONFLICT
+    # cannot touch the same row twice in one statement, so keep the last copy.
+    rows = list({row["strava_activity_id"]: row for row in rows}.values())
+    strava_ids = [row["strava_activity_id"] for row in rows]
+
+    existing_result = await db.execute(
+        select(
+            Activity.strava_activity_id, Activity.content_hash, Activity.start_date
+        ).where(Activity.strava_activity_id.in_(strava_ids))
+    )
+    existing = {
+        strava_id: (content_hash, start_date)
+        for strava_id, content_hash, start_date in existing_result.all()
+    }
+
+    for row in rows:
+        strava_id = row["strava_activity_id"]
+        if strava_id not in existing:
+            result.created += 1
+        elif not update_existing or existing[strava_id][0] == row["content_hash"]:
+            result.unchanged += 1
+            continue
+        else:
+            result.updated += 1
+            result.affected_days |= activity_days(existing[strava_id][1])
+        result.affected_days |= activity_days(row["start_date"])
+        result.changed_rows.append(row)
+
+    insert = dialect_insert(db.get_bind().dialect.name)
+    changed = result.changed_rows
+    if changed and bulk_copy and db.get_bind().dialect.name == "postgresql":
+        await _copy_upsert(db, changed)
+    else:
+        for start in range(0, len(changed), UPSERT_CHUNK_SIZE):
+            stmt = insert(Activity).values(changed[start:start + UPSERT_CHUNK_SIZE])
+            await db.execute(_on_conflict_update(stmt))
+
+    for user_id in {row["user_id"] for row in changed}:
+        await refresh_rollups(db, user_id, result.affected_days)
+
+    return result
+
+
+async def get_sync_state(db: AsyncSession, user_id: int) -> SyncState:
+    """Load the user's sync cursor, creating an empty one if needed."""
+    state = await db.get(SyncState, user_id)
+    if state is None:
+        state = SyncState(user_id=user_id)
+        db.add(state)
+    return state
+
+
+def latest_start_date(rows: list[dict[str, Any]]) -> datetime | None:
+    """Return the newest start date in a batch of mapped rows."""
+    return max((row["start_date"] for row in rows), default=None)
+
+
+def advance_sync_cursor(state: SyncState, latest: datetime | None):
+    """Move the high-water mark forward (never backwards)."""
+    if latest and (state.latest_activity_at is None or latest > state.latest_activity_at):
+        state.latest_activity_at = latest
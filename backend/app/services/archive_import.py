@@ -0,0 +1,171 @@
+"""
+Import activities from a Strava bulk export archive ("Download your data").
+
+The archive's `activities.csv` is stream-parsed in batches and written
+through the same bulk upsert path as API syncs, so a full history can be
+loaded without any Strava API calls. The export carries gear *names* only,
+so gear is matched by name against equipment already synced from Strava.
+"""
+import csv
+import io
+import zipfile
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Iterator
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.equipment import Equipment
+from app.services.activity_sync import (
+    advance_sync_cursor,
+    get_sync_state,
+    latest_start_date,
+    map_strava_activity,
+    upsert_activities,
+)
+from app.services.cache import invalidate_user
+
+IMPORT_BATCH_SIZE = 500
+
+# "Activity Date" as written by the English export, e.g. "Mar 1, 2024, 6:30:00 AM"
+EXPORT_DATE_FORMATS = ("%b %d, %Y, %I:%M:%S %p", "%Y-%m-%d %H:%M:%S")
+
+
+class ArchiveImportError(ValueError):
+    pass
+
+
+def _header_index(header: list[str]) -> dict[str, int]:
+    """
+    Map column names to positions. The export repeats some headers
+    ("Distance", "Elapsed Time", "Commute"); the later copy holds the raw
+    metric value, so the last occurrence wins.
+    """
+    return {name.strip(): position for position, name in enumerate(header)}
+
+
+def _float(value: str | None) -> float | None:
+    if value is None or value.strip() == "":
+        return None
+    return float(value.replace(",", ""))
+
+
+def _int(value: str | None) -> int:
+    number = _float(value)
+    return int(number) if number is not None else 0
+
+
+def _bool(value: str | None) -> bool:
+    return (value or "").strip().lower() in ("true", "1", "1.0")
+
+
+def _export_date(value: str) -> str:
+    """Parse an export date (UTC) into the ISO form the Strava API returns."""
+    for date_format in EXPORT_DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(value.strip(), date_format)
+        except ValueError:
+            continue
+        return parsed.replace(tzinfo=timezone.utc).isoformat().replace("+00:00", "Z")
+    raise ArchiveImportError(f"Unrecognised activity date: {value!r}")
+
+
+def parse_activities_csv(
+    text_stream: io.TextIOBase, gear_ids_by_name: dict[str, str]
+) -> Iterator[dict[str, Any]]:
+    """
+    Yield one Strava-API-shaped activity dict per CSV row. Gear names are
+    resolved to Strava gear IDs through `gear_ids_by_name` (lower-cased).
+    """
+    reader = csv.reader(text_stream)
+    try:
+        index = _header_index(next(reader))
+    except StopIteration:
+        return
+    if "Activity ID" not in index or "Activity Date" not in index:
+        raise ArchiveImportError("activities.csv has no Activity ID or Activity Date column")
+
+    def cell(row: list[str], name: str) -> str | None:
+        position = index.get(name)
+        return row[position] if position is not None and position < len(row) else None
+
+    for row in reader:
+        if not row:
+            continue
+        activity_type = (cell(row, "Activity Type") or "Unknown").replace(" ", "")
+        gear_name = (cell(row, "Activity Gear") or "").strip()
+
+        yield {
+            "id": int(cell(row, "Activity ID")),
+            "name": cell(row, "Activity Name"),
+            "type": activity_type,
+            "sport_type": activity_type,
+            "start_date": _export_date(cell(row, "Activity Date")),
+            "distance": _float(cell(row, "Distance")) or 0,
+            "moving_time": _int(cell(row, "Moving Time")),
+            "elapsed_time": _int(cell(row, "Elapsed Time")),
+            "total_elevation_gain": _float(cell(row, "Elevation Gain")),
+            "average_speed": _float(cell(row, "Average Speed")),
+            "max_speed": _float(cell(row, "Max Speed")),
+            "commute": _bool(cell(row, "Commute")),
+            "gear_id": gear_ids_by_name.get(gear_name.lower()) if gear_name else None,
+            "_gear_name": gear_name,
+        }
+
+
+def _batches(items: Iterator[dict[str, Any]], size: int) -> Iterator[list[dict[str, Any]]]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def import_strava_archive(
+    db: AsyncSession, user_id: int, archive: BinaryIO
+) -> dict[str, Any]:
+    """
+    Import every activity in a Strava export ZIP for a user. Activities that
+    already exist are left untouched (API data is richer than the export).
+    Each batch is committed on its own and advances the sync cursor, so the
+    next regular sync only reconciles the recent window.
+    """
+    try:
+        zip_file = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise ArchiveImportError("Not a ZIP archive")
+    if "activities.csv" not in zip_file.namelist():
+        raise ArchiveImportError("activities.csv not found in archive")
+
+    eq_result = await db.execute(select(Equipment).where(Equipment.user_id == user_id))
+    all_equipment = eq_result.scalars().all()
+    equipment_map = {eq.strava_gear_id: eq.id for eq in all_equipment}
+    gear_ids_by_name = {eq.name.strip().lower(): eq.strava_gear_id for eq in all_equipment}
+    state = await get_sync_state(db, user_id)
+
+    totals = {"imported": 0, "created": 0, "unchanged": 0}
+    unmatched_gear: set[str] = set()
+
+    with zip_file.open("activities.csv") as raw_csv:
+        text_stream = io.TextIOWrapper(raw_csv, encoding="utf-8-sig", newline="")
+        activities = parse_activities_csv(text_stream, gear_ids_by_name)
+        for batch in _batches(activities, IMPORT_BATCH_SIZE):
+            rows = []
+            for activity_data in batch:
+                if activity_data["_gear_name"] and not activity_data["gear_id"]:
+                    unmatched_gear.add(activity_data["_gear_name"])
+                rows.append(map_strava_activity(activity_data, user_id, equipment_map))
+
+            result = await upsert_activities(db, rows, bulk_copy=True, update_existing=False)
+            advance_sync_cursor(state, latest_start_date(rows))
+            if result.changed_rows:
+                await invalidate_user(db, user_id)
+            await db.commit()
+
+            totals["imported"] += len(rows)
+            totals["created"] += result.created
+            totals["unchanged"] += result.unchanged
+
+    return {**totals, "unmatched_gear": sorted(unmatched_gear)}
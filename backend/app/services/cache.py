@@ -0,0 +1,150 @@
+"""
+Per-user response cache for read-heavy dashboard endpoints.
+
+Cached responses are keyed by the user's *data version*, a counter in
+`sync_states` that every write path bumps in the same transaction as the
+write (`invalidate_user`). The version lives in the database, so a write
+made by another API process or a CLI tool is seen here too; stale entries
+are never served again and simply age out of the backend.
+"""
+import functools
+import json
+from datetime import datetime
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import dialect_insert
+from app.models.sync_state import SyncState
+
+
+class CacheBackend:
+    """Storage for cached responses."""
+
+    async def get(self, key: str) -> Any | None:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any):
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU cache."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Any] = OrderedDict()
+
+    async def get(self, key: str) -> Any | None:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class NullCacheBackend(CacheBackend):
+    """Disables caching."""
+
+    def __init__(self, max_entries: int = 0):
+        pass
+
+    async def get(self, key: str) -> Any | None:
+        return None
+
+    async def set(self, key: str, value: Any):
+        pass
+
+
+# Selectable via the RESPONSE_CACHE_BACKEND setting
+CACHE_BACKENDS: dict[str, type[CacheBackend]] = {
+    "memory": MemoryCacheBackend,
+    "none": NullCacheBackend,
+}
+
+
+class ResponseCache:
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+
+    async def get_or_compute(
+        self, user_id: int, version: int, key: str, compute: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """
+        Return the cached response for `key` at the user's data `version`,
+        computing and storing it on a miss. Callers read the version before
+        computing, so a write that lands mid-computation leaves the result
+        under an already-stale key. Keys also roll over daily since some
+        responses depend on today's date.
+        """
+        today = datetime.utcnow().date().isoformat()
+        cache_key = f"response:{user_id}:{version}:{today}:{key}"
+
+        cached = await self.backend.get(cache_key)
+        if cached is not None:
+            return cached
+
+        value = jsonable_encoder(await compute())
+        await self.backend.set(cache_key, value)
+        return value
+
+
+@functools.lru_cache()
+def get_response_cache() -> ResponseCache:
+    settings = get_settings()
+    backend_class = CACHE_BACKENDS[settings.response_cache_backend]
+    return ResponseCache(backend_class(max_entries=settings.response_cache_max_entries))
+
+
+async def data_version(db: AsyncSession, user_id: int) -> int:
+    """The user's current data version (0 before their first write)."""
+    version = await db.scalar(
+        select(SyncState.data_version).where(SyncState.user_id == user_id)
+    )
+    return version or 0
+
+
+async def invalidate_user(db: AsyncSession, user_id: int):
+    """
+    Bump the user's data version. Call it in the transaction of any write
+    that changes the user's data, before committing, so the new version
+    becomes visible together with the data.
+    """
+    insert = dialect_insert(db.get_bind().dialect.name)
+    # An upsert, so two first writes for the same user cannot both insert
+    await db.execute(
+        insert(SyncState)
+        .values(user_id=user_id, data_version=1)
+        .on_conflict_do_update(
+            index_elements=[SyncState.user_id],
+            set_={"data_version": SyncState.data_version + 1},
+        )
+    )
+
+
+def cached_response(endpoint):
+    """
+    Cache a GET endpoint's response per user. The endpoint must take the
+    current user as `user` and a session as `db`; its other parameters form
+    the key.
+    """
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        params = {name: value for name, value in kwargs.items() if name not in ("db", "user")}
+        key = f"{endpoint.__module__}.{endpoint.__name__}:{json.dumps(params, sort_keys=True, default=str)}"
+        user_id = kwargs["user"].id
+        version = await data_version(kwargs["db"], user_id)
+        return await get_response_cache().get_or_compute(
+            user_id, version, key, lambda: endpoint(**kwargs)
+        )
+
+    return wrapper
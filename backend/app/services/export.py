@@ -0,0 +1,191 @@
+"""
+Streaming activity export.
+
+Rows are read from a server-side cursor in partitions of `EXPORT_BATCH_SIZE`
+and each partition is encoded and yielded on its own, so memory use stays
+constant regardless of how many activities a user has.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.activity import Activity
+from app.models.equipment import Equipment
+
+EXPORT_BATCH_SIZE = 1000
+
+# Exported activity columns, in output order (gear_name is appended)
+EXPORT_COLUMNS = (
+    "id",
+    "strava_activity_id",
+    "name",
+    "activity_type",
+    "sport_type",
+    "start_date",
+    "distance",
+    "moving_time",
+    "elapsed_time",
+    "total_elevation_gain",
+    "average_speed",
+    "max_speed",
+    "trainer",
+    "commute",
+    "manual",
+    "private",
+    "device_name",
+    "external_id",
+    "gear_id",
+    "strava_gear_id",
+)
+EXPORT_FIELDS = EXPORT_COLUMNS + ("gear_name",)
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+def export_statement(*criteria) -> Select:
+    """Column-only select of the exported fields, oldest activity first."""
+    return (
+        select(*(getattr(Activity, column) for column in EXPORT_COLUMNS))
+        .where(*criteria)
+        .order_by(Activity.start_date.asc(), Activity.id.asc())
+    )
+
+
+async def export_batches(
+    db: AsyncSession, user_id: int, statement: Select
+) -> AsyncIterator[list[dict[str, Any]]]:
+    """Stream export rows as dicts, with gear names resolved from a local map."""
+    gear_result = await db.execute(
+        select(Equipment.id, Equipment.name).where(Equipment.user_id == user_id)
+    )
+    gear_names = dict(gear_result.all())
+
+    result = await db.stream(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for partition in result.partitions():
+        batch = []
+        for row in partition:
+            record = row._asdict()
+            record["gear_name"] = gear_names.get(record["gear_id"])
+            batch.append(record)
+        yield batch
+
+
+async def encode_csv(batches: AsyncIterator[list[dict[str, Any]]]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    async for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+async def encode_ndjson(batches: AsyncIterator[list[dict[str, Any]]]) -> AsyncIterator[str]:
+    async for batch in batches:
+        yield "".join(json.dumps(record, default=_json_default) + "\n" for record in batch)
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back in chunks."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    types = {
+        "id": pa.int64(),
+        "strava_activity_id": pa.int64(),
+        "start_date": pa.timestamp("us"),
+        "distance": pa.float64(),
+        "moving_time": pa.int64(),
+        "elapsed_time": pa.int64(),
+        "total_elevation_gain": pa.float64(),
+        "average_speed": pa.float64(),
+        "max_speed": pa.float64(),
+        "trainer": pa.bool_(),
+        "commute": pa.bool_(),
+        "manual": pa.bool_(),
+        "private": pa.bool_(),
+        "gear_id": pa.int64(),
+    }
+    return pa.schema([(field, types.get(field, pa.string())) for field in EXPORT_FIELDS])
+
+
+async def encode_parquet(batches: AsyncIterator[list[dict[str, Any]]]) -> AsyncIterator[bytes]:
+    """Encode each batch as a Parquet row group (requires the optional pyarrow)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for batch in batches:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    # Closing the writer emits the footer
+    yield sink.drain()
+
+
+ENCODERS = {
+    "csv": encode_csv,
+    "ndjson": encode_ndjson,
+    "parquet": encode_parquet,
+}
+
+
+def encode_export(format: str, batches: AsyncIterator[list[dict[str, Any]]]) -> AsyncIterator[Any]:
+    return ENCODERS[format](batches)
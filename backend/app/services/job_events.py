@@ -0,0 +1,133 @@
+"""
+In-process pub/sub for job progress, streamed to browsers over SSE.
+
+Every write a `JobRun` makes is also published as a `progress` event that
+carries only the fields that changed. Each user has a bounded replay
+buffer, so a reconnecting EventSource that sends `Last-Event-ID` receives
+exactly what it missed. Event ids are `<process epoch>-<sequence>`. An id
+from another process, or one older than the buffer, gets a `reset` event
+instead, telling the client to re-read job status from the status
+endpoints. A buffer with no new events for `REPLAY_BUFFER_TTL_SECONDS` (its
+jobs finished long ago) is dropped.
+
+Events only reach subscribers connected to the process running the job;
+with several API processes, clients fall back to the status endpoints.
+"""
+import asyncio
+import functools
+import json
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+# Events kept per user for Last-Event-ID replay
+REPLAY_BUFFER_SIZE = 100
+# Replay buffers idle this long are dropped
+REPLAY_BUFFER_TTL_SECONDS = 15 * 60
+# Events buffered for one connection before it is told to reset
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+@dataclass
+class JobEvent:
+    id: str
+    sequence: int
+    event: str
+    data: dict[str, Any]
+    published_at: float  # time.monotonic()
+
+    def encode(self) -> str:
+        """Format the event as an SSE message."""
+        return f"id: {self.id}\nevent: {self.event}\ndata: {json.dumps(self.data)}\n\n"
+
+
+class JobEventBroker:
+    def __init__(
+        self,
+        replay_size: int = REPLAY_BUFFER_SIZE,
+        replay_ttl_seconds: float = REPLAY_BUFFER_TTL_SECONDS,
+    ):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        self.replay_size = replay_size
+        self.replay_ttl_seconds = replay_ttl_seconds
+        # Replay buffers, least recently published first
+        self._history: OrderedDict[int, deque[JobEvent]] = OrderedDict()
+        # Newest sequence in any dropped buffer; older ids may have missed events
+        self._pruned_through = 0
+        self._subscribers: defaultdict[int, set[asyncio.Queue]] = defaultdict(set)
+
+    def _next_event(self, event: str, data: dict[str, Any]) -> JobEvent:
+        self._sequence += 1
+        return JobEvent(
+            f"{self.epoch}-{self._sequence}", self._sequence, event, data, time.monotonic()
+        )
+
+    def publish(self, user_id: int, data: dict[str, Any]):
+        """Send a progress event to the user's connections and replay buffer."""
+        event = self._next_event("progress", data)
+        history = self._history.setdefault(user_id, deque(maxlen=self.replay_size))
+        history.append(event)
+        self._history.move_to_end(user_id)
+        self._prune()
+        for queue in self._subscribers.get(user_id, ()):
+            if queue.full():
+                # A stalled connection gets one reset instead of a backlog
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.reset_event())
+            else:
+                queue.put_nowait(event)
+
+    def _prune(self):
+        """Drop the buffers of users whose newest event has outlived the TTL."""
+        cutoff = time.monotonic() - self.replay_ttl_seconds
+        while self._history:
+            user_id, history = next(iter(self._history.items()))
+            if history[-1].published_at >= cutoff:
+                break
+            self._pruned_through = history[-1].sequence
+            del self._history[user_id]
+
+    def reset_event(self) -> JobEvent:
+        return self._next_event("reset", {})
+
+    def replay(self, user_id: int, last_event_id: str | None) -> list[JobEvent] | None:
+        """
+        Events published after `last_event_id`, or None if they can no longer
+        be reconstructed from the buffer.
+        """
+        if not last_event_id:
+            return []
+        epoch, _, sequence = last_event_id.partition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+
+        sequence = int(sequence)
+        history = self._history.get(user_id, ())
+        if history and history[0].sequence <= sequence:
+            return [event for event in history if event.sequence > sequence]
+        # The id predates the buffer; that is only complete if nothing was
+        # trimmed from it and no buffer was dropped since the id was sent
+        if len(history) == self.replay_size or sequence < self._pruned_through:
+            return None
+        return list(history)
+
+    @contextmanager
+    def subscribe(self, user_id: int) -> Iterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[user_id].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[user_id].discard(queue)
+            if not self._subscribers[user_id]:
+                del self._subscribers[user_id]
+
+
+@functools.lru_cache()
+def get_job_event_broker() -> JobEventBroker:
+    return JobEventBroker()
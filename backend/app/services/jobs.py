@@ -0,0 +1,338 @@
+"""
+Persistent background job records.
+
+Backfills and rule applications record their state in the `jobs` table, so
+it survives restarts and is visible to every API worker. A running job is
+driven through a `JobRun`, which keeps progress in memory and writes it
+through at most every `job_progress_interval_seconds`; status changes are
+written immediately. Every write refreshes the job's heartbeat, and an
+active job whose heartbeat is older than `job_heartbeat_timeout_seconds`
+belongs to a worker that went away and is reported as interrupted.
+
+A user has at most one active job per kind and resource. A unique index
+over active jobs enforces this in the database, so two concurrent starts
+cannot both succeed; the loser gets `JobConflictError`. Finished jobs are
+evicted by age and by count, so status lookups stay index-bounded.
+
+Each write is also published to the user's job event stream
+(`app.services.job_events`) as a delta of the fields that changed.
+
+JobRun writes use their own short sessions on the write engine, so a job
+body must not call them while its own session holds an open transaction
+(the SQLite production profile has a single write connection).
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.database import async_session
+from app.models.job import Job
+from app.services.job_events import get_job_event_broker
+
+logger = logging.getLogger(__name__)
+
+# Errors kept per job; older ones are dropped first
+JOB_ERROR_LIMIT = 50
+
+ACTIVE_STATUSES = ("queued", "running", "rate_limited")
+FINISHED_STATUSES = ("completed", "paused", "error", "interrupted")
+# Finished without completing; the job can be queued again from its checkpoint
+RESUMABLE_STATUSES = ("paused", "error", "interrupted")
+
+
+class JobConflictError(Exception):
+    """The user already has an active job of this kind for the resource."""
+
+
+def _heartbeat_cutoff() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=get_settings().job_heartbeat_timeout_seconds)
+
+
+class JobRun:
+    """In-memory state of a running job, written through to its `jobs` row."""
+
+    def __init__(self, job: Job):
+        self.id = job.id
+        self.user_id = job.user_id
+        self.kind = job.kind
+        self.resource_id = job.resource_id
+        self.params = dict(job.params or {})
+        self.status = job.status
+        self.message = job.message
+        self.progress = dict(job.progress or {})
+        self.errors = list(job.errors or [])
+        self.checkpoint = job.checkpoint
+        self._saved_at = 0.0
+        self._published: dict[str, Any] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        return self.progress[key]
+
+    def __setitem__(self, key: str, value: Any):
+        self.progress[key] = value
+
+    def add_error(self, error: Any):
+        self.errors.append(error)
+        if len(self.errors) > JOB_ERROR_LIMIT:
+            del self.errors[:-JOB_ERROR_LIMIT]
+
+    def publish(self, **fields):
+        """Publish the fields that changed since the last event for this job."""
+        snapshot = {
+            "status": self.status,
+            "message": self.message,
+            **self.progress,
+            "errors": list(self.errors),
+            **fields,
+        }
+        delta = {key: value for key, value in snapshot.items() if self._published.get(key) != value}
+        self._published.update(snapshot)
+        get_job_event_broker().publish(
+            self.user_id,
+            {
+                "job_id": self.id,
+                "kind": self.kind,
+                "resource_id": self.resource_id,
+                "status": self.status,
+                **delta,
+            },
+        )
+
+    async def save(self, **values):
+        """Write the current state, refresh the heartbeat and publish the changes."""
+        self._saved_at = time.monotonic()
+        async with async_session() as db:
+            await db.execute(
+                update(Job)
+                .where(Job.id == self.id)
+                .values(
+                    status=self.status,
+                    message=self.message,
+                    progress=dict(self.progress),
+                    errors=list(self.errors),
+                    heartbeat_at=datetime.utcnow(),
+                    **values,
+                )
+            )
+            await db.commit()
+
+        timestamps = {}
+        if values.get("started_at"):
+            timestamps["started_at"] = values["started_at"].isoformat()
+        if values.get("finished_at"):
+            timestamps["completed_at"] = values["finished_at"].isoformat()
+        self.publish(**timestamps)
+
+    async def update(self):
+        """Write progress if the throttle interval has passed since the last write."""
+        if time.monotonic() - self._saved_at >= get_settings().job_progress_interval_seconds:
+            await self.save()
+
+    async def set_status(self, status: str, message: str | None = None):
+        self.status = status
+        if message is not None:
+            self.message = message
+        await self.save()
+
+    async def sleep(self, seconds: float):
+        """Wait (e.g. for a rate limit window) while keeping the heartbeat fresh."""
+        step = get_settings().job_heartbeat_timeout_seconds / 4
+        remaining = seconds
+        while remaining > 0:
+            await asyncio.sleep(min(remaining, step))
+            remaining -= step
+            await self.save()
+
+
+async def create_job(
+    user_id: int,
+    kind: str,
+    resource_id: int | None = None,
+    params: dict[str, Any] | None = None,
+    progress: dict[str, Any] | None = None,
+) -> JobRun:
+    """
+    Record a new queued job and return its run handle. Raises
+    `JobConflictError` if an active job of the same kind and resource exists.
+    """
+    now = datetime.utcnow()
+    job = Job(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        kind=kind,
+        resource_id=resource_id,
+        params=params or {},
+        status="queued",
+        progress=progress or {},
+        errors=[],
+        created_at=now,
+        heartbeat_at=now,
+    )
+    async with async_session() as db:
+        # A job that stopped heartbeating must not block its replacement
+        await expire_jobs(db, user_id)
+        db.add(job)
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            raise JobConflictError(f"A {kind} job is already active") from None
+
+    run = JobRun(job)
+    run.publish(started_at=now.isoformat())
+    return run
+
+
+async def save_checkpoint(db: AsyncSession, run: JobRun, checkpoint: dict[str, Any]):
+    """
+    Record a job's resume position in the caller's transaction, so it
+    commits together with the work it describes.
+    """
+    run.checkpoint = checkpoint
+    await db.execute(update(Job).where(Job.id == run.id).values(checkpoint=checkpoint))
+
+
+async def resume_job(job_id: str) -> JobRun | None:
+    """
+    Queue a resumable job again, keeping its checkpoint. Returns None if the
+    job is not resumable, e.g. because another worker already resumed it or
+    another job of its kind is active.
+    """
+    async with async_session() as db:
+        await expire_jobs(db)
+        try:
+            result = await db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status.in_(RESUMABLE_STATUSES))
+                .values(
+                    status="queued",
+                    message=None,
+                    heartbeat_at=datetime.utcnow(),
+                    finished_at=None,
+                )
+            )
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            return None
+        if result.rowcount != 1:
+            return None
+        job = await db.get(Job, job_id)
+
+    run = JobRun(job)
+    run.publish(completed_at=None)
+    return run
+
+
+async def run_job(run: JobRun, body: Callable[..., Awaitable[None]], *args):
+    """
+    Run a job body and record how it ended. The body reports its outcome by
+    setting `run.status` to a finished status (or leaving it running, which
+    means completed) and returning; an exception marks the job as failed.
+    If the outcome cannot be recorded, the job stops heartbeating and is
+    reported as interrupted once its heartbeat expires.
+    """
+    run.status = "running"
+    try:
+        await run.save(started_at=datetime.utcnow())
+        await body(run, *args)
+    except asyncio.CancelledError:
+        # Shutting down; record it so the job is not left looking alive
+        run.status = "interrupted"
+        await _save_outcome(run)
+        raise
+    except Exception as e:
+        run.status = "error"
+        run.add_error(str(e))
+
+    if run.status not in FINISHED_STATUSES:
+        run.status = "completed"
+    await _save_outcome(run)
+
+
+async def _save_outcome(run: JobRun):
+    try:
+        await run.save(finished_at=datetime.utcnow())
+    except Exception:
+        logger.exception("Could not record the outcome of job %s", run.id)
+
+
+async def latest_job(
+    db: AsyncSession, user_id: int, kind: str, resource_id: int | None = None
+) -> Job | None:
+    """Return the user's most recent job of a kind (for one resource, if given)."""
+    statement = select(Job).where(Job.user_id == user_id, Job.kind == kind)
+    if resource_id is not None:
+        statement = statement.where(Job.resource_id == resource_id)
+    result = await db.execute(statement.order_by(Job.created_at.desc()).limit(1))
+    return result.scalar_one_or_none()
+
+
+def job_status(job: Job) -> dict[str, Any]:
+    """Status payload for a job, in the shape the status endpoints return."""
+    status = job.status
+    if status in ACTIVE_STATUSES and (
+        job.heartbeat_at is None or job.heartbeat_at < _heartbeat_cutoff()
+    ):
+        status = "interrupted"
+
+    payload = {
+        "job_id": job.id,
+        "status": status,
+        "started_at": (job.started_at or job.created_at).isoformat(),
+        **(job.progress or {}),
+        "errors": job.errors or [],
+        "completed_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if job.message:
+        payload["message"] = job.message
+    return payload
+
+
+async def expire_jobs(db: AsyncSession, user_id: int | None = None):
+    """
+    Mark active jobs that stopped heartbeating as interrupted and purge
+    finished jobs older than the retention period. Also keep only the newest
+    `job_retention_count` finished jobs per kind and resource, for one user
+    or (at startup) for everyone.
+    """
+    settings = get_settings()
+    now = datetime.utcnow()
+    await db.execute(
+        update(Job)
+        .where(Job.status.in_(ACTIVE_STATUSES), Job.heartbeat_at < _heartbeat_cutoff())
+        .values(status="interrupted", finished_at=now)
+    )
+    await db.execute(
+        delete(Job).where(Job.finished_at < now - timedelta(days=settings.job_retention_days))
+    )
+
+    finished = Job.status.in_(FINISHED_STATUSES)
+    if user_id is not None:
+        finished = finished & (Job.user_id == user_id)
+    ranked = (
+        select(
+            Job.id,
+            func.row_number()
+            .over(
+                partition_by=(Job.user_id, Job.kind, Job.resource_id),
+                order_by=Job.created_at.desc(),
+            )
+            .label("rank"),
+        )
+        .where(finished)
+        .subquery()
+    )
+    await db.execute(
+        delete(Job).where(
+            Job.id.in_(select(ranked.c.id).where(ranked.c.rank > settings.job_retention_count))
+        )
+    )
+    await db.commit()
@@ -0,0 +1,51 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any
+
+# Sort columns whose cursor values are JSON numbers; the rest are strings
+NUMERIC_SORTS = ("distance", "moving_time")
+
+
+def encode_cursor(sort_by: str, sort_order: str, value: Any, row_id: int) -> str:
+    """Build an opaque keyset cursor pointing just past (value, row_id)."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps({"s": sort_by, "o": sort_order, "v": value, "i": row_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str) -> tuple[Any, int]:
+    """
+    Decode a keyset cursor into its (sort value, id) position.
+    Raises ValueError if the cursor is malformed or was issued for a
+    different sort.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, row_id = payload["v"], int(payload["i"])
+        issued_for = (payload["s"], payload["o"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if issued_for != (sort_by, sort_order):
+        raise ValueError("Cursor was issued for a different sort order")
+
+    try:
+        value = _sort_value(sort_by, value)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    return value, row_id
+
+
+def _sort_value(sort_by: str, value: Any) -> Any:
+    """Convert a cursor's sort value back to the type of its sort column."""
+    if sort_by == "start_date":
+        return datetime.fromisoformat(value)
+    if sort_by in NUMERIC_SORTS:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise TypeError(f"Expected a number, got {value!r}")
+    elif not isinstance(value, str):
+        raise TypeError(f"Expected a string, got {value!r}")
+    return value
@@ -0,0 +1,112 @@
+from datetime import date, datetime, time, timedelta
+from typing import Iterable
+from sqlalchemy import Select, and_, delete, func, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import day_bucket, dialect_insert
+from app.models.activity import Activity
+from app.models.rollup import GearUsageRollup
+
+# Days recomputed per DELETE/INSERT pair
+REFRESH_CHUNK_SIZE = 100
+
+# Totals replaced when a refresh finds a group's row already present
+ROLLUP_TOTAL_COLUMNS = [
+    "activity_count",
+    "distance",
+    "moving_time",
+    "elevation_gain",
+    "last_start_date",
+]
+
+ROLLUP_COLUMNS = [
+    "user_id",
+    "gear_id",
+    "activity_type",
+    "day",
+    "activity_count",
+    "distance",
+    "moving_time",
+    "elevation_gain",
+    "last_start_date",
+]
+
+
+def rollup_source(dialect_name: str, *criteria) -> Select:
+    """
+    Aggregate activities into rollup rows (one per user, gear, type and day),
+    in the column order of `ROLLUP_COLUMNS`.
+    """
+    day = day_bucket(Activity.start_date, dialect_name)
+    return (
+        select(
+            Activity.user_id,
+            Activity.gear_id,
+            Activity.activity_type,
+            day,
+            func.count(Activity.id),
+            func.coalesce(func.sum(Activity.distance), 0),
+            func.coalesce(func.sum(Activity.moving_time), 0),
+            func.coalesce(func.sum(Activity.total_elevation_gain), 0),
+            func.max(Activity.start_date),
+        )
+        .where(*criteria)
+        .group_by(Activity.user_id, Activity.gear_id, Activity.activity_type, day)
+    )
+
+
+def _day_ranges(days: list[date]):
+    """Match activities starting on any of `days` with index-friendly ranges."""
+    return or_(
+        *(
+            and_(
+                Activity.start_date >= datetime.combine(day, time.min),
+                Activity.start_date < datetime.combine(day + timedelta(days=1), time.min),
+            )
+            for day in days
+        )
+    )
+
+
+def activity_days(*start_dates: datetime | None) -> set[date]:
+    """Return the rollup days touched by activities with these start dates."""
+    return {start_date.date() for start_date in start_dates if start_date}
+
+
+async def refresh_rollups(db: AsyncSession, user_id: int, days: Iterable[date]):
+    """
+    Recompute a user's rollup rows for the given days from `activities`.
+    Call this after activities starting on those days were inserted, updated
+    or moved to another day. The caller is responsible for committing.
+
+    Rows are upserted on the group's unique index, so a concurrent refresh
+    of the same days (possible on PostgreSQL) that inserted after our DELETE
+    is overwritten with the same totals rather than counted twice.
+    """
+    days = sorted(set(days))
+    dialect_name = db.get_bind().dialect.name
+    insert = dialect_insert(dialect_name)
+
+    for start in range(0, len(days), REFRESH_CHUNK_SIZE):
+        chunk = days[start:start + REFRESH_CHUNK_SIZE]
+        await db.execute(
+            delete(GearUsageRollup).where(
+                GearUsageRollup.user_id == user_id,
+                GearUsageRollup.day.in_(chunk),
+            )
+        )
+        stmt = insert(GearUsageRollup).from_select(
+            ROLLUP_COLUMNS,
+            rollup_source(dialect_name, Activity.user_id == user_id, _day_ranges(chunk)),
+        )
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[
+                    GearUsageRollup.user_id,
+                    text("coalesce(gear_id, 0)"),
+                    GearUsageRollup.activity_type,
+                    GearUsageRollup.day,
+                ],
+                set_={column: stmt.excluded[column] for column in ROLLUP_TOTAL_COLUMNS},
+            )
+        )
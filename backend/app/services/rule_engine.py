@@ -5,24 +5,23 @@ from app.models.rule import Rule, RuleCondition
 
 
 class RuleEngine:
-    """Engine for evaluating rules against activities."""
+    """
+    Engine for evaluating rules against activities.
 
-    # Equipment map for lookups (set before evaluation)
-    _equipment_map: dict[int, str] = {}
+    Callers pass `equipment_names`, the user's equipment ID to name mapping,
+    which the `current_gear_name` field is looked up in.
+    """
 
     @classmethod
-    def set_equipment_map(cls, equipment_map: dict[int, str]):
-        """Set the equipment ID to name mapping for lookups."""
-        cls._equipment_map = equipment_map
-
-    @classmethod
-    def evaluate_condition(cls, activity: Activity, condition: RuleCondition) -> bool:
+    def evaluate_condition(
+        cls, activity: Activity, condition: RuleCondition, equipment_names: dict[int, str]
+    ) -> bool:
         """Evaluate a single condition against an activity."""
         # Handle virtual fields that need lookups
         if condition.field == "current_gear_name":
             # Look up equipment name from gear_id
-            if activity.gear_id and activity.gear_id in cls._equipment_map:
-                field_value = cls._equipment_map[activity.gear_id]
+            if activity.gear_id and activity.gear_id in equipment_names:
+                field_value = equipment_names[activity.gear_id]
             else:
                 field_value = None
         else:
@@ -94,7 +93,9 @@ class RuleEngine:
         return False
 
     @classmethod
-    def evaluate_rule(cls, activity: Activity, rule: Rule) -> bool:
+    def evaluate_rule(
+        cls, activity: Activity, rule: Rule, equipment_names: dict[int, str]
+    ) -> bool:
         """
         Evaluate all conditions in a rule against an activity.
         Returns True if the activity matches all conditions.
@@ -110,7 +111,7 @@ class RuleEngine:
         current_logic = "AND"
 
         for condition in rule.conditions:
-            result = cls.evaluate_condition(activity, condition)
+            result = cls.evaluate_condition(activity, condition, equipment_names)
             results.append((result, condition.logic))
 
         # Evaluate with AND/OR logic
@@ -133,24 +134,24 @@ class RuleEngine:
 
     @classmethod
     def find_matching_activities(
-        cls, activities: list[Activity], rule: Rule
+        cls, activities: list[Activity], rule: Rule, equipment_names: dict[int, str]
     ) -> list[Activity]:
         """Find all activities that match a rule."""
         return [
             activity
             for activity in activities
-            if cls.evaluate_rule(activity, rule)
+            if cls.evaluate_rule(activity, rule, equipment_names)
         ]
 
     @classmethod
     def find_first_matching_rule(
-        cls, activity: Activity, rules: list[Rule]
+        cls, activity: Activity, rules: list[Rule], equipment_names: dict[int, str]
     ) -> Rule | None:
         """
         Find the first rule that matches an activity.
         Rules should be sorted by priority.
         """
         for rule in sorted(rules, key=lambda r: r.priority):
-            if rule.is_active and cls.evaluate_rule(activity, rule):
+            if rule.is_active and cls.evaluate_rule(activity, rule, equipment_names):
                 return rule
         return None
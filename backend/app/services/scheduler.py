@@ -0,0 +1,157 @@
+"""
+In-process scheduler for background jobs.
+
+Jobs are queued per priority class and per user, and a fixed pool of
+workers takes them in order: the most urgent priority class first, and
+round-robin across users within a class, so one user's queue cannot starve
+everyone else. A user never has more than `job_max_per_user` jobs running
+at once. Queued jobs are kept alive by the scheduler's heartbeat, so they
+are not mistaken for jobs abandoned by a dead worker.
+"""
+import asyncio
+import functools
+import logging
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime
+from enum import IntEnum
+from typing import Any, Awaitable, Callable
+from sqlalchemy import update
+
+from app.config import get_settings
+from app.database import async_session
+from app.models.job import Job
+from app.services.jobs import JobRun, run_job
+
+logger = logging.getLogger(__name__)
+
+
+class JobPriority(IntEnum):
+    INTERACTIVE = 0  # started by a user waiting on the result, e.g. rule apply
+    BULK = 1  # long-running imports, e.g. backfill
+
+
+@dataclass
+class QueuedJob:
+    run: JobRun
+    body: Callable[..., Awaitable[None]]
+    args: tuple[Any, ...]
+
+
+class JobScheduler:
+    def __init__(self, workers: int, max_per_user: int, heartbeat_seconds: float):
+        self.workers = workers
+        self.max_per_user = max_per_user
+        self.heartbeat_seconds = heartbeat_seconds
+        # priority -> user_id -> that user's queued jobs, in round-robin order
+        self._queues: dict[JobPriority, OrderedDict[int, deque[QueuedJob]]] = {
+            priority: OrderedDict() for priority in JobPriority
+        }
+        self._running: Counter[int] = Counter()
+        self._changed: asyncio.Condition | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def submit(
+        self, run: JobRun, body: Callable[..., Awaitable[None]], *args, priority: JobPriority
+    ):
+        """Queue a job body to be run through `run_job` by a worker."""
+        users = self._queues[priority]
+        users.setdefault(run.user_id, deque()).append(QueuedJob(run, body, args))
+        await self._notify()
+
+    async def start(self):
+        self._changed = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    async def stop(self):
+        """Cancel the workers (running jobs record themselves as interrupted)."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        queued_ids = self._queued_ids()
+        for users in self._queues.values():
+            users.clear()
+        if queued_ids:
+            async with async_session() as db:
+                await db.execute(
+                    update(Job)
+                    .where(Job.id.in_(queued_ids))
+                    .values(status="interrupted", finished_at=datetime.utcnow())
+                )
+                await db.commit()
+
+    async def _notify(self):
+        if self._changed is None:
+            return  # Not started yet; the workers pick the queue up on start
+        async with self._changed:
+            self._changed.notify_all()
+
+    def _take_next(self) -> QueuedJob | None:
+        for priority in JobPriority:
+            users = self._queues[priority]
+            for user_id in list(users):
+                if self._running[user_id] >= self.max_per_user:
+                    continue
+                jobs = users[user_id]
+                job = jobs.popleft()
+                if jobs:
+                    users.move_to_end(user_id)  # back of the line for this class
+                else:
+                    del users[user_id]
+                return job
+        return None
+
+    async def _worker(self):
+        while True:
+            async with self._changed:
+                while (job := self._take_next()) is None:
+                    await self._changed.wait()
+                self._running[job.run.user_id] += 1
+
+            try:
+                await run_job(job.run, job.body, *job.args)
+            except Exception:
+                # Keep the worker alive for the jobs queued behind this one
+                logger.exception("Job %s failed in the scheduler", job.run.id)
+            finally:
+                self._running[job.run.user_id] -= 1
+                await self._notify()
+
+    def _queued_ids(self) -> list[str]:
+        return [
+            job.run.id
+            for users in self._queues.values()
+            for jobs in users.values()
+            for job in jobs
+        ]
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            queued_ids = self._queued_ids()
+            if not queued_ids:
+                continue
+            try:
+                async with async_session() as db:
+                    await db.execute(
+                        update(Job)
+                        .where(Job.id.in_(queued_ids), Job.status == "queued")
+                        .values(heartbeat_at=datetime.utcnow())
+                    )
+                    await db.commit()
+            except Exception:
+                # Retry on the next beat, well before the queued jobs go stale
+                logger.exception("Could not refresh the heartbeat of queued jobs")
+
+
+@functools.lru_cache()
+def get_job_scheduler() -> JobScheduler:
+    settings = get_settings()
+    return JobScheduler(
+        workers=settings.job_workers,
+        max_per_user=settings.job_max_per_user,
+        heartbeat_seconds=settings.job_heartbeat_timeout_seconds / 4,
+    )
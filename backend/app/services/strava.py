@@ -1,5 +1,5 @@
 import httpx
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Any
 from app.config import get_settings
 
@@ -9,6 +9,13 @@ settings = get_settings()
 API_TIMEOUT = 30.0
 
 
+def _to_epoch(value: datetime) -> int:
+    """Convert a datetime to a Unix timestamp, treating naive values as UTC."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
 class StravaService:
     def __init__(self, access_token: str | None = None):
         self.access_token = access_token
@@ -85,9 +92,9 @@ class StravaService:
         params: dict[str, Any] = {"page": page, "per_page": per_page}
 
         if before:
-            params["before"] = int(before.timestamp())
+            params["before"] = _to_epoch(before)
         if after:
-            params["after"] = int(after.timestamp())
+            params["after"] = _to_epoch(after)
 
         async with httpx.AsyncClient(timeout=API_TIMEOUT) as client:
             response = await client.get(
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import sys
+from typing import Any, AsyncIterable, Awaitable, Callable
+
+from app.services.activity_sync import map_strava_activity
+
+# Marks the end of a stage's output
+_DONE = object()
+
+# Pages buffered between stages. A slow writer fills these queues and blocks
+# the fetcher, so at most a couple of pages are held in memory at once.
+DEFAULT_QUEUE_SIZE = 2
+
+PageSource = AsyncIterable[list[dict[str, Any]]]
+BatchWriter = Callable[[list[dict[str, Any]]], Awaitable[dict[str, int]]]
+ProgressCallback = Callable[[dict[str, int]], Awaitable[None]]
+
+
+class SyncPipeline:
+    """
+    Streams Strava activity pages into the database in three stages:
+    fetch (any async iterable of raw pages), map (Strava JSON to rows) and
+    write (a caller-supplied batch writer). Stages run concurrently and are
+    connected by bounded queues, so fetching the next page overlaps with
+    writing the current one.
+    """
+
+    def __init__(
+        self,
+        user_id: int,
+        equipment_map: dict[str, int],
+        write_batch: BatchWriter,
+        on_progress: ProgressCallback | None = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ):
+        self.user_id = user_id
+        self.equipment_map = equipment_map
+        self.write_batch = write_batch
+        self.on_progress = on_progress
+        self.queue_size = queue_size
+        self.totals = {"pages": 0, "activities": 0, "created": 0, "updated": 0, "unchanged": 0}
+
+    async def run(self, pages: PageSource) -> dict[str, int]:
+        """Run all stages until the page source is exhausted and return totals."""
+        raw_pages: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        row_batches: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        tasks = [
+            asyncio.create_task(self._fetch(pages, raw_pages)),
+            asyncio.create_task(self._map(raw_pages, row_batches)),
+            asyncio.create_task(self._write(row_batches)),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # A failing stage would leave its neighbours blocked on a queue
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        return self.totals
+
+    async def _fetch(self, pages: PageSource, out: asyncio.Queue):
+        async for page in pages:
+            if page:
+                await out.put(page)
+        await out.put(_DONE)
+
+    async def _map(self, source: asyncio.Queue, out: asyncio.Queue):
+        while (page := await source.get()) is not _DONE:
+            rows = [
+                map_strava_activity(activity_data, self.user_id, self.equipment_map)
+                for activity_data in page
+            ]
+            await out.put(rows)
+        await out.put(_DONE)
+
+    async def _write(self, source: asyncio.Queue):
+        while (rows := await source.get()) is not _DONE:
+            counts = await self.write_batch(rows)
+
+            self.totals["pages"] += 1
+            self.totals["activities"] += len(rows)
+            for key, value in counts.items():
+                self.totals[key] = self.totals.get(key, 0) + value
+
+            if self.on_progress:
+                await self.on_progress(self.totals)
+
+
+def process_rss_mb() -> float:
+    """
+    Resident memory of this process in MB. Falls back to the peak RSS where
+    /proc is not available, which can only overstate current use.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
@@ -0,0 +1,203 @@
+"""
+Confirm that the hot query paths are served by the expected indexes.
+
+Runs EXPLAIN (QUERY PLAN) for a representative version of each hot query
+against the configured database and exits non-zero if any plan does not
+use one of the expected indexes.
+
+    python -m app.tools.check_query_plans
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from sqlalchemy import Connection, Select, select, func, tuple_
+
+from app.database import engine, init_db, month_bucket
+from app.models import Activity, Equipment, GearUsageRollup, Job, Rule, RuleCondition
+from app.services.rollups import rollup_source
+
+USER_ID = 1
+GEAR_ID = 1
+
+
+def hot_queries(dialect_name: str) -> list[tuple[str, Select, set[str]]]:
+    """(label, statement, acceptable indexes) for each hot query path."""
+    since = datetime.utcnow() - timedelta(days=180)
+    return [
+        (
+            "get_activities (default sort)",
+            select(Activity)
+            .where(Activity.user_id == USER_ID)
+            .order_by(Activity.start_date.desc())
+            .limit(50),
+            {"ix_activities_user_start_date"},
+        ),
+        (
+            "get_activities (start_date cursor)",
+            select(Activity)
+            .where(
+                Activity.user_id == USER_ID,
+                tuple_(Activity.start_date, Activity.id) < tuple_(since, 1000),
+            )
+            .order_by(Activity.start_date.desc(), Activity.id.desc())
+            .limit(50),
+            {"ix_activities_user_start_date"},
+        ),
+        (
+            "get_activities (distance cursor)",
+            select(Activity)
+            .where(
+                Activity.user_id == USER_ID,
+                tuple_(Activity.distance, Activity.id) < tuple_(10000.0, 1000),
+            )
+            .order_by(Activity.distance.desc(), Activity.id.desc())
+            .limit(50),
+            {"ix_activities_user_distance"},
+        ),
+        (
+            "get_activities (equipment filter)",
+            select(Activity)
+            .where(Activity.user_id == USER_ID, Activity.gear_id == GEAR_ID)
+            .order_by(Activity.start_date.desc())
+            .limit(50),
+            {"ix_activities_user_gear_start_date"},
+        ),
+        (
+            "get_activities (activity type filter)",
+            select(Activity)
+            .where(Activity.user_id == USER_ID, Activity.activity_type == "Ride")
+            .order_by(Activity.start_date.desc())
+            .limit(50),
+            {"ix_activities_user_type_start_date"},
+        ),
+        (
+            "get_activity_stats",
+            select(
+                func.sum(GearUsageRollup.activity_count),
+                func.sum(GearUsageRollup.distance),
+            ).where(GearUsageRollup.user_id == USER_ID),
+            {"ix_gear_usage_rollup_user_day", "ix_gear_usage_rollup_user_gear_day"},
+        ),
+        (
+            "get_equipment_stats",
+            select(
+                GearUsageRollup.gear_id,
+                func.sum(GearUsageRollup.activity_count),
+                func.sum(GearUsageRollup.moving_time),
+                func.max(GearUsageRollup.last_start_date),
+            )
+            .where(GearUsageRollup.user_id == USER_ID, GearUsageRollup.gear_id.isnot(None))
+            .group_by(GearUsageRollup.gear_id),
+            {"ix_gear_usage_rollup_user_gear_day", "ix_gear_usage_rollup_user_day"},
+        ),
+        (
+            "get_equipment_usage_history",
+            select(GearUsageRollup.gear_id, func.sum(GearUsageRollup.distance))
+            .where(
+                GearUsageRollup.user_id == USER_ID,
+                GearUsageRollup.day >= since.date(),
+                GearUsageRollup.gear_id.isnot(None),
+            )
+            .group_by(GearUsageRollup.gear_id, month_bucket(GearUsageRollup.day, dialect_name)),
+            {"ix_gear_usage_rollup_user_day", "ix_gear_usage_rollup_user_gear_day"},
+        ),
+        (
+            "refresh_rollups",
+            rollup_source(
+                dialect_name,
+                Activity.user_id == USER_ID,
+                Activity.start_date >= since,
+                Activity.start_date < since + timedelta(days=1),
+            ),
+            {"ix_activities_user_start_date", "ix_activities_user_gear_start_date"},
+        ),
+        (
+            "run_backfill (oldest activity)",
+            select(Activity.start_date)
+            .where(Activity.user_id == USER_ID)
+            .order_by(Activity.start_date.asc())
+            .limit(1),
+            {"ix_activities_user_start_date"},
+        ),
+        (
+            "get_equipment",
+            select(Equipment)
+            .where(Equipment.user_id == USER_ID, Equipment.is_retired == False)
+            .order_by(Equipment.equipment_type, Equipment.name),
+            {"ix_equipment_user_type_name"},
+        ),
+        (
+            "get_rules",
+            select(Rule).where(Rule.user_id == USER_ID).order_by(Rule.priority),
+            {"ix_rules_user_priority"},
+        ),
+        (
+            "get_rules (conditions)",
+            select(RuleCondition).where(RuleCondition.rule_id.in_([1, 2, 3])),
+            {"ix_rule_conditions_rule_id"},
+        ),
+        (
+            "get_apply_status",
+            select(Job)
+            .where(Job.user_id == USER_ID, Job.kind == "rule_apply", Job.resource_id == 1)
+            .order_by(Job.created_at.desc())
+            .limit(1),
+            {"ix_jobs_user_kind_resource_created"},
+        ),
+        (
+            "get_backfill_status",
+            select(Job)
+            .where(Job.user_id == USER_ID, Job.kind == "backfill")
+            .order_by(Job.created_at.desc())
+            .limit(1),
+            {"ix_jobs_user_kind_created"},
+        ),
+    ]
+
+
+def explain(conn: Connection, statement: Select) -> str:
+    """Return the database's query plan for a statement as text."""
+    compiled = statement.compile(
+        dialect=conn.dialect, compile_kwargs={"render_postcompile": True}
+    )
+    params = compiled.construct_params()
+    args = tuple(params[name] for name in compiled.positiontup or ())
+
+    if conn.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", args).all()
+        return "\n".join(row[-1] for row in rows)
+
+    rows = conn.exec_driver_sql(f"EXPLAIN {compiled}", args).all()
+    return "\n".join(row[0] for row in rows)
+
+
+def check_plans(conn: Connection) -> bool:
+    if conn.dialect.name == "postgresql":
+        # Small or empty tables would otherwise always be sequentially scanned
+        conn.exec_driver_sql("SET enable_seqscan = off")
+
+    all_ok = True
+    for label, statement, expected in hot_queries(conn.dialect.name):
+        plan = explain(conn, statement)
+        used = sorted(index for index in expected if index in plan)
+        ok = bool(used)
+        all_ok = all_ok and ok
+
+        print(f"[{'ok' if ok else 'MISSING'}] {label}: {', '.join(used) or 'no expected index used'}")
+        if not ok:
+            for line in plan.splitlines():
+                print(f"      {line}")
+
+    return all_ok
+
+
+async def main() -> int:
+    await init_db()
+    async with engine.connect() as conn:
+        all_ok = await conn.run_sync(check_plans)
+    await engine.dispose()
+    return 0 if all_ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,40 @@
+"""
+Import a Strava bulk export archive for a user from the command line.
+
+    python -m app.tools.import_strava_archive <user_id> export_12345678.zip
+"""
+import asyncio
+import sys
+
+from app.database import async_session, close_db, init_db
+from app.services.archive_import import ArchiveImportError, import_strava_archive
+
+
+async def main(argv: list[str]) -> int:
+    if len(argv) != 2 or not argv[0].isdigit():
+        print(__doc__)
+        return 2
+    user_id, path = int(argv[0]), argv[1]
+
+    await init_db()
+    try:
+        async with async_session() as db:
+            with open(path, "rb") as archive:
+                totals = await import_strava_archive(db, user_id, archive)
+    except ArchiveImportError as e:
+        print(f"Import failed: {e}")
+        return 1
+    finally:
+        await close_db()
+
+    print(
+        f"Imported {totals['imported']} activities "
+        f"({totals['created']} new, {totals['unchanged']} already stored)"
+    )
+    if totals["unmatched_gear"]:
+        print(f"Gear not found (sync equipment first): {', '.join(totals['unmatched_gear'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv[1:])))
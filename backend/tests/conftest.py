@@ -0,0 +1,15 @@
+"""
+Shared test setup.
+
+The app builds its engines from DATABASE_URL at import time, so point it at
+a throwaway SQLite file before any `app` module is imported. Tests that need
+concurrent writers run against PostgreSQL when TEST_POSTGRES_URL is set,
+e.g. postgresql+asyncpg://postgres@localhost/strava_test, and are skipped
+otherwise.
+"""
+import os
+import tempfile
+
+os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///" + os.path.join(
+    tempfile.mkdtemp(prefix="strava-tests-"), "test.db"
+)
@@ -0,0 +1,72 @@
+import asyncio
+import types
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+import app.routers.activities as activities_router
+from app.config import get_settings
+from app.database import async_session, close_db, init_db
+from app.models import Activity, User
+from app.routers.activities import BACKFILL_PROGRESS, run_backfill
+from app.services.jobs import create_job, resume_job, run_job
+from app.services.strava import StravaService
+
+STRAVA_ACTIVITIES = [
+    {
+        "id": 5000 + i,
+        "name": f"Ride {i}",
+        "type": "Ride",
+        "start_date": (datetime(2025, 1, 1) + timedelta(hours=6 * i)).isoformat() + "Z",
+        "distance": 1000.0,
+        "moving_time": 600,
+    }
+    for i in range(1000)
+]
+
+
+async def _no_sleep(seconds):
+    pass
+
+
+def test_resumed_backfill_is_not_paused_by_memory_already_held(monkeypatch):
+    rss = {"mb": 500.0}
+
+    async def get_athlete_activities(self, before=None, after=None, page=1, per_page=50):
+        # The first page allocates 150 MB that the process keeps afterwards
+        rss["mb"] = 650.0
+        newest_first = sorted(STRAVA_ACTIVITIES, key=lambda a: a["start_date"], reverse=True)
+        return newest_first[(page - 1) * per_page:page * per_page]
+
+    monkeypatch.setattr(StravaService, "get_athlete_activities", get_athlete_activities)
+    monkeypatch.setattr(activities_router, "process_rss_mb", lambda: rss["mb"])
+    monkeypatch.setattr(activities_router, "asyncio", types.SimpleNamespace(sleep=_no_sleep))
+    monkeypatch.setattr(get_settings(), "backfill_memory_limit_mb", 100)
+
+    async def run():
+        await init_db()
+        try:
+            async with async_session() as db:
+                db.add(User(id=7, strava_athlete_id=7, access_token="token"))
+                await db.commit()
+
+            job = await create_job(7, "backfill", progress=BACKFILL_PROGRESS)
+            await run_job(job, run_backfill)
+            first_run = (job.status, job["pages_processed"])
+
+            # Memory held by the first run must not count against the second
+            job = await resume_job(job.id)
+            await run_job(job, run_backfill)
+            second_run = (job.status, job["pages_processed"])
+
+            async with async_session() as db:
+                stored = await db.scalar(select(func.count(Activity.id)))
+        finally:
+            await close_db()
+        return first_run, second_run, stored
+
+    first_run, second_run, stored = asyncio.run(run())
+    # Pages already fetched when the pause is requested are still written
+    assert first_run[0] == "paused" and first_run[1] < 10
+    assert second_run == ("completed", 10)
+    assert stored == len(STRAVA_ACTIVITIES)
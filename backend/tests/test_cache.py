@@ -0,0 +1,29 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import Base
+from app.models import User
+from app.services.cache import data_version, invalidate_user
+
+
+def test_invalidate_user_creates_then_bumps_the_version(tmp_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'cache.db'}")
+        session = async_sessionmaker(engine, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            async with session() as db:
+                db.add(User(id=1, strava_athlete_id=1))
+                await db.commit()
+                versions = [await data_version(db, 1)]
+                for _ in range(2):
+                    await invalidate_user(db, 1)
+                    await db.commit()
+                    versions.append(await data_version(db, 1))
+        finally:
+            await engine.dispose()
+        return versions
+
+    assert asyncio.run(run()) == [0, 1, 2]
@@ -0,0 +1,37 @@
+import time
+
+from app.services.job_events import JobEventBroker
+
+
+def test_replay_returns_events_after_the_last_seen_id():
+    broker = JobEventBroker()
+    broker.publish(1, {"job_id": "a", "processed": 1})
+    broker.publish(1, {"job_id": "a", "processed": 2})
+    first, second = broker.replay(1, f"{broker.epoch}-0")
+    assert broker.replay(1, first.id) == [second]
+    assert broker.replay(1, second.id) == []
+
+
+def test_replay_resets_once_events_were_trimmed():
+    broker = JobEventBroker(replay_size=2)
+    for processed in range(3):
+        broker.publish(1, {"job_id": "a", "processed": processed})
+    assert broker.replay(1, f"{broker.epoch}-1") is None
+
+
+def test_idle_buffers_are_dropped(monkeypatch):
+    broker = JobEventBroker(replay_ttl_seconds=60)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    broker.publish(1, {"job_id": "a", "status": "completed"})
+    last_seen = broker.replay(1, f"{broker.epoch}-0")[-1].id
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    broker.publish(2, {"job_id": "b", "status": "running"})
+
+    assert 1 not in broker._history
+    assert 2 in broker._history
+    # Up to date when the buffer was dropped, so nothing was missed...
+    assert broker.replay(1, last_seen) == []
+    # ...but an older id may have missed events that are gone now
+    assert broker.replay(1, f"{broker.epoch}-0") is None
@@ -0,0 +1,67 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from app.services.pagination import decode_cursor, encode_cursor
+
+
+def _raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+@pytest.mark.parametrize(
+    "sort_by, value",
+    [
+        ("start_date", datetime(2026, 3, 1, 7, 30)),
+        ("name", "Morning Ride"),
+        ("activity_type", "Ride"),
+        ("distance", 12345.6),
+        ("moving_time", 3600),
+    ],
+)
+def test_round_trip(sort_by, value):
+    cursor = encode_cursor(sort_by, "desc", value, 42)
+    assert decode_cursor(cursor, sort_by, "desc") == (value, 42)
+
+
+def test_rejects_cursor_for_another_sort():
+    cursor = encode_cursor("name", "asc", "Morning Ride", 42)
+    with pytest.raises(ValueError, match="different sort order"):
+        decode_cursor(cursor, "name", "desc")
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        _raw_cursor("just a string"),
+        _raw_cursor([1, 2]),
+        _raw_cursor({"s": "start_date", "o": "desc", "v": "2026-03-01"}),
+        _raw_cursor({"s": "start_date", "o": "desc", "v": "2026-03-01", "i": "x"}),
+    ],
+)
+def test_rejects_malformed_cursor(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor, "start_date", "desc")
+
+
+@pytest.mark.parametrize(
+    "sort_by, value",
+    [
+        ("start_date", 1700000000),
+        ("start_date", None),
+        ("start_date", "yesterday"),
+        ("distance", "abc"),
+        ("distance", None),
+        ("distance", True),
+        ("moving_time", "3600"),
+        ("name", 5),
+        ("activity_type", None),
+    ],
+)
+def test_rejects_sort_value_of_wrong_type(sort_by, value):
+    cursor = _raw_cursor({"s": sort_by, "o": "asc", "v": value, "i": 42})
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor, sort_by, "asc")
@@ -0,0 +1,83 @@
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database import Base
+from app.models import Activity, GearUsageRollup, User
+from app.services.rollups import activity_days, refresh_rollups
+
+POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+ACTIVITY_COUNT = 250
+
+
+def _activities(user_id: int) -> list[Activity]:
+    return [
+        Activity(
+            strava_activity_id=1000 + i,
+            user_id=user_id,
+            name=f"Activity {i}",
+            activity_type="Ride" if i % 2 else "Run",
+            start_date=datetime(2026, 3, 1) + timedelta(hours=19 * i),
+            distance=1000.0 * i,
+            moving_time=60 * i,
+            total_elevation_gain=float(i),
+        )
+        for i in range(ACTIVITY_COUNT)
+    ]
+
+
+@pytest.mark.skipif(not POSTGRES_URL, reason="needs TEST_POSTGRES_URL")
+def test_overlapping_refreshes_do_not_double_count():
+    async def run():
+        engine = create_async_engine(POSTGRES_URL)
+        session = async_sessionmaker(engine, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            async with session() as db:
+                db.add(User(id=1, strava_athlete_id=1))
+                await db.flush()
+                activities = _activities(1)
+                db.add_all(activities)
+                await db.commit()
+            days = activity_days(*(activity.start_date for activity in activities))
+
+            # The second refresh starts while the first is uncommitted, so
+            # its DELETE misses the rows the first one inserts
+            async with session() as first, session() as second:
+                await refresh_rollups(first, 1, days)
+                overlapping = asyncio.create_task(refresh_rollups(second, 1, days))
+                await asyncio.sleep(0.5)
+                await first.commit()
+                await overlapping
+                await second.commit()
+
+            async with session() as db:
+                total = await db.scalar(select(func.sum(GearUsageRollup.activity_count)))
+                groups = await db.scalar(select(func.count(GearUsageRollup.id)))
+                distinct_groups = await db.scalar(
+                    select(func.count()).select_from(
+                        select(
+                            GearUsageRollup.gear_id,
+                            GearUsageRollup.activity_type,
+                            GearUsageRollup.day,
+                        )
+                        .distinct()
+                        .subquery()
+                    )
+                )
+        finally:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+            await engine.dispose()
+        return total, groups, distinct_groups
+
+    total, groups, distinct_groups = asyncio.run(run())
+    assert total == ACTIVITY_COUNT
+    assert groups == distinct_groups
@@ -25,6 +25,20 @@ export const authApi = {
   },
 }
 
+// Query params for the activity listing filters
+function activityFilterParams(filters) {
+  const params = new URLSearchParams()
+  if (filters.search) params.append('search', filters.search)
+  if (filters.activityType) params.append('activity_type', filters.activityType)
+  if (filters.equipmentId) params.append('equipment_id', filters.equipmentId)
+  if (filters.trainer !== undefined && filters.trainer !== '') {
+    params.append('trainer', filters.trainer)
+  }
+  if (filters.dateFrom) params.append('date_from', filters.dateFrom)
+  if (filters.dateTo) params.append('date_to', filters.dateTo)
+  return params
+}
+
 // Activities API
 export const activitiesApi = {
   getStats: async () => {
@@ -33,22 +47,34 @@ export const activitiesApi = {
   },
 
   getAll: async (filters = {}) => {
-    const params = new URLSearchParams()
-    if (filters.search) params.append('search', filters.search)
-    if (filters.activityType) params.append('activity_type', filters.activityType)
-    if (filters.equipmentId) params.append('equipment_id', filters.equipmentId)
-    if (filters.trainer !== undefined && filters.trainer !== '') {
-      params.append('trainer', filters.trainer)
-    }
-    if (filters.dateFrom) params.append('date_from', filters.dateFrom)
-    if (filters.dateTo) params.append('date_to', filters.dateTo)
+    const { items } = await activitiesApi.getPage(filters)
+    return items
+  },
+
+  // Returns one page plus the keyset cursor for the page after it (if any)
+  getPage: async (filters = {}) => {
+    const params = activityFilterParams(filters)
     if (filters.sortBy) params.append('sort_by', filters.sortBy)
     if (filters.sortOrder) params.append('sort_order', filters.sortOrder)
     if (filters.limit) params.append('limit', filters.limit)
-    if (filters.offset !== undefined) params.append('offset', filters.offset)
+    if (filters.cursor) {
+      params.append('cursor', filters.cursor)
+    } else if (filters.offset !== undefined) {
+      params.append('offset', filters.offset)
+    }
 
     const response = await client.get(`/activities?${params.toString()}`)
-    return response.data
+    return {
+      items: response.data,
+      nextCursor: response.headers['x-next-cursor'] || null,
+    }
+  },
+
+  // Download URL for a streamed export of every activity matching the filters
+  getExportUrl: (filters = {}, format = 'csv') => {
+    const params = activityFilterParams(filters)
+    params.append('format', format)
+    return `${API_URL}/api/activities/export?${params.toString()}`
   },
 
   getById: async (id) => {
@@ -71,8 +97,25 @@ export const activitiesApi = {
     return response.data
   },
 
-  sync: async (days = 30) => {
-    const response = await client.post(`/activities/sync?days=${days}`)
+  // Without `days` the backend only fetches activities newer than its sync cursor
+  sync: async (days = null) => {
+    const query = days ? `?days=${days}` : ''
+    const response = await client.post(`/activities/sync${query}`)
+    return response.data
+  },
+
+  // Upload a Strava bulk export ZIP ("Download your data")
+  importArchive: async (file) => {
+    const form = new FormData()
+    form.append('archive', file)
+    const response = await client.post('/activities/import', form, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+    })
+    return response.data
+  },
+
+  syncRecentEdits: async (days = 30) => {
+    const response = await client.post(`/activities/sync/recent-edits?days=${days}`)
     return response.data
   },
 
@@ -156,6 +199,23 @@ export const rulesApi = {
     const response = await client.get(`/rules/${id}/apply/status`)
     return response.data
   },
+
+  // Apply every active rule, highest priority first
+  applyAll: async () => {
+    const response = await client.post('/rules/apply-all')
+    return response.data
+  },
+
+  getApplyAllStatus: async () => {
+    const response = await client.get('/rules/apply-all/status')
+    return response.data
+  },
+}
+
+// Jobs API
+export const jobsApi = {
+  // Server-Sent Events stream of job progress for the current user
+  getEventsUrl: () => `${API_URL}/api/jobs/events`,
 }
 
 export default client
@@ -24,6 +24,8 @@ export const useActivitiesStore = defineStore('activities', () => {
     sortBy: 'start_date',
     sortOrder: 'desc'
   })
+  // Keyset cursors for pages reached by stepping forward; other pages use offset
+  let pageCursors = {}
 
   // Initialize with mock data if in mock mode
   if (USE_MOCK_DATA) {
@@ -69,15 +71,24 @@ export const useActivitiesStore = defineStore('activities', () => {
 
     try {
       // Include pagination and sorting in the request
-      const offset = (pagination.value.page - 1) * pagination.value.pageSize
-      const data = await activitiesApi.getAll({
+      const page = pagination.value.page
+      if (page === 1) {
+        // Filters, sorting or page size may have changed
+        pageCursors = {}
+      }
+      const offset = (page - 1) * pagination.value.pageSize
+      const { items, nextCursor } = await activitiesApi.getPage({
         ...filters,
         sortBy: sorting.value.sortBy,
         sortOrder: sorting.value.sortOrder,
         limit: pagination.value.pageSize,
+        cursor: pageCursors[page],
         offset
       })
-      activities.value = data
+      activities.value = items
+      if (nextCursor) {
+        pageCursors[page + 1] = nextCursor
+      }
     } catch (e) {
       console.error('Failed to fetch activities:', e)
       error.value = e.response?.data?.detail || e.message
@@ -106,7 +117,7 @@ export const useActivitiesStore = defineStore('activities', () => {
     pagination.value.page = 1
   }
 
-  async function syncFromStrava(days = 30) {
+  async function syncFromStrava(days = null) {
     if (USE_MOCK_DATA) {
       // Simulate sync delay
       isSyncing.value = true
@@ -190,7 +201,7 @@ export const useActivitiesStore = defineStore('activities', () => {
     try {
       const result = await activitiesApi.startBackfill()
       isBackfilling.value = true
-      backfillStatus.value = { status: 'running', activities_found: 0, pages_processed: 0 }
+      backfillStatus.value = { job_id: result.job_id, status: 'queued', activities_found: 0, pages_processed: 0 }
       return result
     } catch (e) {
       console.error('Failed to start backfill:', e)
@@ -207,7 +218,7 @@ export const useActivitiesStore = defineStore('activities', () => {
     try {
       const status = await activitiesApi.getBackfillStatus()
       backfillStatus.value = status
-      isBackfilling.value = status.status === 'running' || status.status === 'rate_limited'
+      isBackfilling.value = ['queued', 'running', 'rate_limited'].includes(status.status)
       return status
     } catch (e) {
       console.error('Failed to get backfill status:', e)
@@ -215,6 +226,34 @@ export const useActivitiesStore = defineStore('activities', () => {
     }
   }
 
+  // Merge a pushed backfill progress event (a delta) into the status
+  function applyBackfillEvent(event) {
+    const { kind, resource_id, ...fields } = event
+    if (backfillStatus.value?.job_id === event.job_id) {
+      Object.assign(backfillStatus.value, fields)
+    } else {
+      backfillStatus.value = fields
+    }
+    isBackfilling.value = ['queued', 'running', 'rate_limited'].includes(event.status)
+  }
+
+  async function importArchive(file) {
+    isSyncing.value = true
+    error.value = null
+
+    try {
+      const result = await activitiesApi.importArchive(file)
+      await Promise.all([fetchActivities(), fetchStats()])
+      return result
+    } catch (e) {
+      console.error('Failed to import archive:', e)
+      error.value = e.response?.data?.detail || e.message
+      throw e
+    } finally {
+      isSyncing.value = false
+    }
+  }
+
   async function fetchStats() {
     if (USE_MOCK_DATA) {
       totalStats.value = { total_activities: mockActivities.length, total_distance: 0, total_time: 0 }
@@ -251,10 +290,12 @@ export const useActivitiesStore = defineStore('activities', () => {
     fetchActivities,
     fetchStats,
     syncFromStrava,
+    importArchive,
     updateEquipment,
     bulkUpdateEquipment,
     startBackfill,
     checkBackfillStatus,
+    applyBackfillEvent,
     setPage,
     setPageSize,
     setSorting,
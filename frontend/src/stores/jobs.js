@@ -1,14 +1,24 @@
 import { defineStore } from 'pinia'
 import { ref, computed } from 'vue'
-import { rulesApi } from '../api/client'
+import { rulesApi, jobsApi } from '../api/client'
 
 const POLL_INTERVAL = 2000
+// While the event stream is connected, a job is only polled after this long
+// without news (events only come from the API process running the job)
+const QUIET_POLL_INTERVAL = 15000
 const STORAGE_KEY = 'equipment_manager_jobs'
+const USE_MOCK_DATA = import.meta.env.VITE_USE_MOCK_DATA === 'true'
 
 export const useJobsStore = defineStore('jobs', () => {
   const jobs = ref([])
   const pollIntervals = {}
 
+  // Progress is pushed over Server-Sent Events; polling is the fallback
+  const eventsConnected = ref(false)
+  const eventListeners = new Set()
+  const lastSeenAt = {}
+  let eventSource = null
+
   // Load persisted jobs on init
   function loadPersistedJobs() {
     try {
@@ -18,14 +28,17 @@ export const useJobsStore = defineStore('jobs', () => {
         // Filter out old completed jobs (older than 1 hour)
         const oneHourAgo = Date.now() - 60 * 60 * 1000
         jobs.value = parsed.filter(job => {
-          if (['completed', 'failed', 'error'].includes(job.status)) {
+          if (['completed', 'failed', 'error', 'interrupted'].includes(job.status)) {
             return new Date(job.completedAt || job.startedAt).getTime() > oneHourAgo
           }
           return true
         })
-        // Resume polling for any running jobs
+        // Resume tracking any running jobs
+        if (jobs.value.some(job => ['running', 'rate_limited', 'starting', 'queued'].includes(job.status))) {
+          connectEvents()
+        }
         jobs.value.forEach(job => {
-          if (['running', 'rate_limited', 'starting'].includes(job.status)) {
+          if (['running', 'rate_limited', 'starting', 'queued'].includes(job.status)) {
             startPolling(job.id)
           }
         })
@@ -46,7 +59,7 @@ export const useJobsStore = defineStore('jobs', () => {
 
   // Computed
   const activeJobs = computed(() =>
-    jobs.value.filter(job => ['running', 'rate_limited', 'starting'].includes(job.status))
+    jobs.value.filter(job => ['running', 'rate_limited', 'starting', 'queued'].includes(job.status))
   )
 
   const hasActiveJobs = computed(() => activeJobs.value.length > 0)
@@ -77,6 +90,7 @@ export const useJobsStore = defineStore('jobs', () => {
     }
     jobs.value.push(job)
     persistJobs()
+    connectEvents()
     startPolling(job.id)
     return job
   }
@@ -86,7 +100,7 @@ export const useJobsStore = defineStore('jobs', () => {
     const job = jobs.value.find(j => j.id === jobId)
     if (job) {
       Object.assign(job, updates)
-      if (['completed', 'failed', 'error'].includes(updates.status)) {
+      if (['completed', 'failed', 'error', 'interrupted'].includes(updates.status)) {
         job.completedAt = new Date().toISOString()
         stopPolling(jobId)
       }
@@ -104,11 +118,45 @@ export const useJobsStore = defineStore('jobs', () => {
   // Clear completed jobs
   function clearCompletedJobs() {
     jobs.value = jobs.value.filter(job =>
-      !['completed', 'failed', 'error'].includes(job.status)
+      !['completed', 'failed', 'error', 'interrupted'].includes(job.status)
     )
     persistJobs()
   }
 
+  // Fetch a job's status from its status endpoint
+  async function pollJob(jobId) {
+    const job = jobs.value.find(j => j.id === jobId)
+    if (!job) return
+    lastSeenAt[jobId] = Date.now()
+
+    try {
+      let status
+      if (job.type === 'rule_apply') {
+        status = await rulesApi.getApplyStatus(job.resourceId)
+      } else if (job.type === 'rule_apply_all') {
+        status = await rulesApi.getApplyAllStatus()
+      }
+      // Add other job types here as needed
+
+      if (status) {
+        updateJob(jobId, {
+          status: status.status,
+          total: status.total || job.total,
+          processed: status.processed || 0,
+          updated: status.updated || 0,
+          errors: status.errors || [],
+        })
+      }
+    } catch (e) {
+      console.error('Failed to poll job status:', e)
+    }
+  }
+
+  // Whether a job has had a pushed event or poll recently enough to skip polling
+  function isFresh(jobId) {
+    return eventsConnected.value && Date.now() - (lastSeenAt[jobId] || 0) < QUIET_POLL_INTERVAL
+  }
+
   // Start polling for a job
   function startPolling(jobId) {
     if (pollIntervals[jobId]) return
@@ -116,35 +164,71 @@ export const useJobsStore = defineStore('jobs', () => {
     const job = jobs.value.find(j => j.id === jobId)
     if (!job) return
 
-    pollIntervals[jobId] = setInterval(async () => {
-      try {
-        let status
-        if (job.type === 'rule_apply') {
-          status = await rulesApi.getApplyStatus(job.resourceId)
-        }
-        // Add other job types here as needed
-
-        if (status) {
-          updateJob(jobId, {
-            status: status.status,
-            total: status.total || job.total,
-            processed: status.processed || 0,
-            updated: status.updated || 0,
-            errors: status.errors || [],
-          })
-        }
-      } catch (e) {
-        console.error('Failed to poll job status:', e)
-      }
+    pollIntervals[jobId] = setInterval(() => {
+      if (!isFresh(jobId)) pollJob(jobId)
     }, POLL_INTERVAL)
   }
 
+  function activeJobIds() {
+    return activeJobs.value.map(job => job.id)
+  }
+
+  // Apply a pushed progress event (only the fields that changed are sent)
+  function handleProgressEvent(event) {
+    lastSeenAt[event.job_id] = Date.now()
+    const job = jobs.value.find(j => j.id === event.job_id)
+    if (job) {
+      const updates = { status: event.status }
+      if (event.total !== undefined) updates.total = event.total || job.total
+      if (event.processed !== undefined) updates.processed = event.processed
+      if (event.updated !== undefined) updates.updated = event.updated
+      if (event.errors !== undefined) updates.errors = event.errors
+      updateJob(job.id, updates)
+    }
+    eventListeners.forEach(listener => listener(event))
+  }
+
+  // Open the job event stream; the browser reconnects with Last-Event-ID
+  function connectEvents() {
+    if (USE_MOCK_DATA || typeof EventSource === 'undefined') return
+    if (eventSource && eventSource.readyState !== EventSource.CLOSED) return
+
+    eventSource = new EventSource(jobsApi.getEventsUrl(), { withCredentials: true })
+
+    eventSource.onopen = () => {
+      eventsConnected.value = true
+    }
+
+    eventSource.onerror = () => {
+      // Poll at the normal rate until the stream is back
+      eventsConnected.value = false
+    }
+
+    eventSource.addEventListener('progress', (e) => {
+      handleProgressEvent(JSON.parse(e.data))
+    })
+
+    // Missed events could not be replayed; re-read status once
+    eventSource.addEventListener('reset', () => {
+      activeJobIds().forEach(pollJob)
+      eventListeners.forEach(listener => listener({ reset: true }))
+    })
+  }
+
+  // Subscribe to job events (all kinds); returns an unsubscribe function
+  function onJobEvent(listener) {
+    eventListeners.add(listener)
+    connectEvents()
+    return () => eventListeners.delete(listener)
+  }
+
   // Stop polling for a job
   function stopPolling(jobId) {
     if (pollIntervals[jobId]) {
       clearInterval(pollIntervals[jobId])
       delete pollIntervals[jobId]
     }
+    delete lastSeenAt[jobId]
   }
 
   // Get job by ID
@@ -157,6 +241,7 @@ export const useJobsStore = defineStore('jobs', () => {
 
   return {
     jobs,
+    eventsConnected,
     activeJobs,
     hasActiveJobs,
     recentJobs,
@@ -165,5 +250,7 @@ export const useJobsStore = defineStore('jobs', () => {
     removeJob,
     clearCompletedJobs,
     getJob,
+    isFresh,
+    onJobEvent,
   }
 })
@@ -217,6 +217,33 @@ export const useRulesStore = defineStore('rules', () => {
     }
   }
 
+  async function applyAllRules() {
+    if (USE_MOCK_DATA) {
+      return { message: 'Apply all not available in mock mode' }
+    }
+
+    error.value = null
+
+    try {
+      const result = await rulesApi.applyAll()
+
+      // Register with global jobs store
+      const jobsStore = useJobsStore()
+      jobsStore.addJob({
+        jobId: result.job_id,
+        type: 'rule_apply_all',
+        name: 'Apply All Rules',
+        description: 'Updating equipment from the highest-priority matching rule',
+      })
+
+      return result
+    } catch (e) {
+      console.error('Failed to start applying all rules:', e)
+      error.value = e.response?.data?.detail || e.message
+      throw e
+    }
+  }
+
   // Helper functions for rule editor
   function getFieldType(fieldValue) {
     const field = ruleFields.find(f => f.value === fieldValue)
@@ -246,6 +273,7 @@ export const useRulesStore = defineStore('rules', () => {
     toggleRuleActive,
     previewRule,
     applyRule,
+    applyAllRules,
     ruleFields,
     ruleOperators,
     getFieldType,